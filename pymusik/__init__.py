@@ -4,5 +4,6 @@ from .composition.pattern import Pattern
 from .composition.chord import Chord
 from .engine.audio_graph import Song, Track
 from .engine.renderer import Renderer
+from .engine.sidechain import Sidechain
 
 __version__ = "0.1.0"
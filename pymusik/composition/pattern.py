@@ -1,11 +1,28 @@
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Sequence
+import numpy as np
 from ..core.pitch import Note, Pitch, Rest
+from ..core.events import EventStore
+from .chord import Chord
+
+def element_notes(el) -> List[Note]:
+    # A Note, or the notes of a chord element (a list of Notes sounding together)
+    if isinstance(el, Note):
+        return [el]
+    if isinstance(el, list):
+        return [n for n in el if isinstance(n, Note)]
+    return []
+
+def element_duration(el) -> float:
+    if isinstance(el, (Note, Rest)):
+        return el.duration
+    return max((n.duration for n in element_notes(el)), default=0.0)
 
 class Pattern:
     def __init__(self, elements: List[Union[Note, str, Pitch, None]] = None, loop: bool = False, length_beats: Optional[float] = None):
         self.elements = []
         self.loop = loop
         self._explicit_length = length_beats
+        self._compiled = None
         if elements:
             for el in elements:
                 if isinstance(el, (Note, Pitch, Rest)):
@@ -14,6 +31,8 @@ class Pattern:
                     self.elements.append(Note(el))
                 elif el is None:
                     self.elements.append(Rest(1.0))
+                elif isinstance(el, Chord):
+                    self.elements.append(el.to_notes())
                 else:
                     self.elements.append(el)
                     
@@ -21,21 +40,82 @@ class Pattern:
     def duration(self) -> float:
         if self._explicit_length is not None:
             return self._explicit_length
-        return sum(el.duration for el in self.elements if hasattr(el, 'duration'))
+        return sum(element_duration(el) for el in self.elements)
 
     def add_note(self, pitch: Union[str, Pitch], duration: float = 1.0, velocity: float = 0.8):
         self.elements.append(Note(pitch, duration, velocity))
 
+    def add_chord(self, chord: Union[Chord, Sequence[Union[str, Pitch]]], duration: float = 1.0,
+                  velocity: float = 0.8):
+        # All notes of the chord start together and the pattern moves on by `duration`
+        if isinstance(chord, Chord):
+            self.elements.append(chord.to_notes(duration, velocity))
+        else:
+            self.elements.append([Note(p, duration, velocity) for p in chord])
+
     def add_rest(self, duration: float = 1.0):
         self.elements.append(Rest(duration))
 
     def humanize(self, velocity_jitter: float = 0.1):
         import random
         for el in self.elements:
-            if isinstance(el, Note):
+            for note in element_notes(el):
                 jitter = (random.random() * 2 - 1) * velocity_jitter
-                el.velocity = max(0.1, min(1.0, el.velocity + jitter))
+                note.velocity = max(0.1, min(1.0, note.velocity + jitter))
         return self
 
+    def signature(self) -> tuple:
+        # Changes whenever an element, or a note's pitch, duration or velocity, is edited
+        return (self.loop, self._explicit_length, tuple(
+            tuple((n.pitch.midi, n.duration, n.velocity) for n in element_notes(el))
+            if not isinstance(el, Rest) else el.duration
+            for el in self.elements))
+
+    def compile(self, total_beats: Optional[float] = None) -> EventStore:
+        # Columnar note events, looped until total_beats. Repetitions are tiled and summed
+        # with a running cumsum, so onsets match walking the elements one by one exactly.
+        signature = self.signature()
+        if self._compiled is None or self._compiled[0] != signature:
+            self._compiled = (signature, self._columns())
+        advances, note_elements, notes, midi, duration, velocity = self._compiled[1]
+
+        period = float(np.sum(advances))
+        repeats = 1
+        if self.loop and total_beats is not None and self.duration > 0 and period > 0:
+            repeats = int(np.ceil(total_beats / period)) + 1
+
+        n_elements = len(advances)
+        starts = np.zeros(n_elements * repeats)
+        np.cumsum(np.tile(advances, repeats)[:-1], out=starts[1:])
+        positions = (note_elements + n_elements * np.arange(repeats)[:, None]).ravel()
+        note_index = np.tile(np.arange(len(notes)), repeats)
+        if total_beats is not None:
+            # An element only starts while the song is still running; the first one always does
+            keep = starts[positions] < total_beats
+            keep |= positions == 0
+            positions = positions[keep]
+            note_index = note_index[keep]
+
+        return EventStore(
+            time=starts[positions],
+            midi=midi[note_index],
+            duration=duration[note_index],
+            velocity=velocity[note_index],
+            note_index=note_index,
+            notes=notes,
+            notes_per_loop=len(notes) if self.loop else None,
+        )
+
+    def _columns(self):
+        # Time each element advances the pattern by, and which element each note belongs to
+        advances = np.array([element_duration(el) for el in self.elements], dtype=np.float64)
+        note_elements = np.array([i for i, el in enumerate(self.elements) for _ in element_notes(el)],
+                                 dtype=np.int64)
+        notes = [n for el in self.elements for n in element_notes(el)]
+        midi = np.array([n.pitch.midi for n in notes], dtype=np.int64)
+        duration = np.array([n.duration for n in notes], dtype=np.float64)
+        velocity = np.array([n.velocity for n in notes], dtype=np.float64)
+        return advances, note_elements, notes, midi, duration, velocity
+
     def __repr__(self):
         return f"Pattern(len={len(self.elements)})"
@@ -6,6 +6,8 @@ SEMITONE_RATIO = 2 ** (1 / 12)
 DEFAULT_SAMPLERATE = 44100
 DEFAULT_BPM = 120.0
 DEFAULT_TIME_SIGNATURE = (4, 4)
+# Songs render in float32; pass dtype=np.float64 for reference renders
+DEFAULT_RENDER_DTYPE = np.float32
 
 MAX_VELOCITY = 1.0
 
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Optional, Any
+from typing import Optional, Any, List
+import numpy as np
 from .pitch import Note
 
 @dataclass
@@ -9,6 +10,8 @@ class Event:
 @dataclass
 class NoteEvent(Event):
     note: Note
+    # Per-note noise seed, assigned by the renderer for reproducible parallel renders
+    seed: Optional[int] = None
     
     @property
     def duration(self) -> float:
@@ -19,3 +22,34 @@ class ParameterEvent(Event):
     parameter: str
     value: Any
     target_id: Optional[str] = None
+
+@dataclass
+class EventStore:
+    # Columnar note events in time order: one array entry per note
+    time: np.ndarray
+    midi: np.ndarray
+    duration: np.ndarray
+    velocity: np.ndarray
+    # Position of each event's Note in `notes`; NoteEvents share the pattern's Note objects
+    note_index: np.ndarray
+    notes: List[Note]
+    # Filled in by Track.compile_events for the song's TimeContext
+    onset_samples: Optional[np.ndarray] = None
+    # For looped patterns, events come in repetitions of this many notes
+    notes_per_loop: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @property
+    def end_beats(self) -> float:
+        if len(self.time) == 0:
+            return 0.0
+        return float(np.max(self.time + self.duration))
+
+    def event(self, i: int, seed: Optional[int] = None) -> NoteEvent:
+        return NoteEvent(time=float(self.time[i]), note=self.notes[self.note_index[i]], seed=seed)
+
+    def events(self) -> List[NoteEvent]:
+        return [NoteEvent(time=t, note=self.notes[i])
+                for t, i in zip(self.time.tolist(), self.note_index.tolist())]
@@ -1,10 +1,14 @@
+import numpy as np
 from typing import Tuple
 
 class TimeContext:
-    def __init__(self, bpm: float = 120.0, time_signature: Tuple[int, int] = (4, 4), sample_rate: int = 44100):
+    def __init__(self, bpm: float = 120.0, time_signature: Tuple[int, int] = (4, 4), sample_rate: int = 44100,
+                 dtype=np.float64):
         self.bpm = bpm
         self.time_signature = time_signature
         self.sample_rate = sample_rate
+        # Sample type of every rendered buffer
+        self.dtype = np.dtype(dtype)
         
     @property
     def seconds_per_beat(self) -> float:
@@ -13,8 +17,12 @@ class TimeContext:
     def beats_to_samples(self, beats: float) -> int:
         return int(beats * self.seconds_per_beat * self.sample_rate)
     
+    def beats_to_samples_array(self, beats: np.ndarray) -> np.ndarray:
+        # Vectorized beats_to_samples, truncating the same way
+        return (np.asarray(beats, dtype=np.float64) * self.seconds_per_beat * self.sample_rate).astype(np.int64)
+
     def samples_to_beats(self, samples: int) -> float:
         return samples / (self.sample_rate * self.seconds_per_beat)
 
     def __repr__(self):
-        return f"TimeContext(bpm={self.bpm}, ts={self.time_signature}, sr={self.sample_rate})"
+        return f"TimeContext(bpm={self.bpm}, ts={self.time_signature}, sr={self.sample_rate}, dtype={self.dtype})"
@@ -1,4 +1,6 @@
 import numpy as np
+from typing import List, Optional, Tuple
+from ..utils.math import float_dtype
 from scipy import signal
 
 class Distortion:
@@ -25,6 +27,20 @@ class Reverb:
         out[delay_samples:] += data[:-delay_samples] * self.room_size
         return out / (1.0 + self.room_size)
 
+def feedback_comb(data: np.ndarray, delay_samples: int, feedback: float) -> np.ndarray:
+    # y[n] = x[n] + feedback * y[n - d]; a block of d samples only reads the block before it
+    out = np.array(data, dtype=float_dtype(data))
+    for start in range(delay_samples, len(out), delay_samples):
+        end = min(start + delay_samples, len(out))
+        out[start:end] += feedback * out[start - delay_samples:end - delay_samples]
+    return out
+
+def _delayed(data: np.ndarray, delay_samples: int) -> np.ndarray:
+    out = np.zeros_like(data, dtype=float_dtype(data))
+    if delay_samples < len(data):
+        out[delay_samples:] = data[:len(data) - delay_samples]
+    return out
+
 class Delay:
     def __init__(self, time: float = 0.3, feedback: float = 0.4, mix: float = 0.3):
         self.time = time
@@ -34,23 +50,121 @@ class Delay:
     def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
         d_samples = int(self.time * sample_rate)
         if d_samples <= 0 or d_samples >= len(data): return data
-        out = np.copy(data)
-        for i in range(d_samples, len(data)):
-            out[i] = (1 - self.mix) * data[i] + self.mix * out[i-d_samples] * self.feedback
-        return out
+        x = (1 - self.mix) * data
+        x[:d_samples] = data[:d_samples]
+        return feedback_comb(x, d_samples, self.mix * self.feedback)
+
+class MultiTapDelay:
+    def __init__(self, taps: List[Tuple[float, float]] = None, feedback: float = 0.3, mix: float = 0.3):
+        # Each tap is (time in seconds, level)
+        self.taps = taps if taps is not None else [(0.25, 0.6), (0.5, 0.4), (0.75, 0.25)]
+        self.feedback = feedback
+        self.mix = mix
+
+    def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
+        wet = np.zeros_like(data, dtype=float_dtype(data))
+        for time, level in self.taps:
+            d_samples = int(time * sample_rate)
+            if d_samples <= 0 or d_samples >= len(data): continue
+            wet += level * feedback_comb(_delayed(data, d_samples), d_samples, self.feedback)
+        return (1 - self.mix) * data + self.mix * wet
+
+class PingPongDelay:
+    def __init__(self, time: float = 0.3, feedback: float = 0.4, mix: float = 0.3):
+        self.time = time
+        self.feedback = feedback
+        self.mix = mix
 
-class Chorus:
-    def __init__(self, rate: float = 1.5, depth: float = 0.002, mix: float = 0.5):
+    def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
+        # Returns a (samples, 2) stereo buffer: odd echoes left, even echoes right
+        d_samples = int(self.time * sample_rate)
+        dry = (1 - self.mix) * data
+        if d_samples <= 0 or d_samples >= len(data):
+            return np.stack([data, data], axis=-1)
+        left = feedback_comb(_delayed(data, d_samples), 2 * d_samples, self.feedback ** 2)
+        right = self.feedback * _delayed(left, d_samples)
+        return np.stack([dry + self.mix * left, dry + self.mix * right], axis=-1)
+
+# Modulated reads are done in cache-sized blocks so the temporaries stay small
+FRACTIONAL_BLOCK = 16384
+
+def _interpolated_read(padded: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    # positions index into `padded` (one leading zero, two trailing zeros) and are consumed in place;
+    # they stay float64 so long buffers keep sub-sample accuracy
+    np.clip(positions, 0, len(padded) - 2, out=positions)
+    idx = positions.astype(np.intp)
+    positions -= idx
+    lo = padded[idx]
+    hi = padded[idx + 1]
+    hi -= lo
+    hi *= positions.astype(padded.dtype, copy=False)
+    hi += lo
+    return hi
+
+def _pad_for_read(data: np.ndarray) -> np.ndarray:
+    padded = np.zeros(len(data) + 3, dtype=float_dtype(data))
+    padded[1:len(data) + 1] = data
+    return padded
+
+def fractional_delay(data: np.ndarray, delay_samples: np.ndarray) -> np.ndarray:
+    # Reads data[n - delay[n]] with linear interpolation; reads outside the buffer are silent
+    padded = _pad_for_read(data)
+    out = np.empty(len(data), dtype=padded.dtype)
+    for start in range(0, len(data), FRACTIONAL_BLOCK):
+        end = min(start + FRACTIONAL_BLOCK, len(data))
+        positions = np.arange(start + 1, end + 1, dtype=float)
+        positions -= delay_samples[start:end]
+        out[start:end] = _interpolated_read(padded, positions)
+    return out
+
+class ModulatedDelay:
+    def __init__(self, rate: float, depth: float, delay: float, mix: float, voices: int = 1):
         self.rate = rate
         self.depth = depth
+        self.delay = delay
         self.mix = mix
+        self.voices = voices
 
     def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
-        t = np.arange(len(data)) / sample_rate
-        offset = (self.depth * sample_rate * np.sin(2 * np.pi * self.rate * t)).astype(int)
-        out = np.copy(data)
-        for i in range(len(data)):
-            idx = i + offset[i]
-            if 0 <= idx < len(data):
-                out[i] = (1 - self.mix) * data[i] + self.mix * data[idx]
+        if len(data) == 0: return data
+        padded = _pad_for_read(data)
+        out = np.empty(len(data), dtype=padded.dtype)
+        omega = 2 * np.pi * self.rate / sample_rate
+        # Voices share the LFO but are spread evenly around its cycle
+        offsets = 2 * np.pi * np.arange(self.voices) / self.voices
+        dry = 1 - self.mix
+        wet = self.mix / self.voices
+
+        # sin(phi + omega * k) = sin(phi) cos(omega * k) + cos(phi) sin(omega * k),
+        # so one table per block length replaces a full np.sin per voice
+        k = np.arange(min(FRACTIONAL_BLOCK, len(data)))
+        sin_k = np.sin(omega * k) * self.depth * sample_rate
+        cos_k = np.cos(omega * k) * self.depth * sample_rate
+        base_delay = self.delay * sample_rate
+
+        for start in range(0, len(data), FRACTIONAL_BLOCK):
+            end = min(start + FRACTIONAL_BLOCK, len(data))
+            span = end - start
+            acc = dry * data[start:end]
+            for offset in offsets:
+                phi = omega * start + offset
+                positions = np.sin(phi) * cos_k[:span]
+                positions += np.cos(phi) * sin_k[:span]
+                positions += base_delay
+                np.subtract(k[:span] + (start + 1), positions, out=positions)
+                acc += wet * _interpolated_read(padded, positions)
+            out[start:end] = acc
         return out
+
+class Chorus(ModulatedDelay):
+    def __init__(self, rate: float = 1.5, depth: float = 0.002, mix: float = 0.5, voices: int = 1, delay: Optional[float] = None):
+        # By default the sweep is centred on `depth` so the read head never runs ahead of the input
+        super().__init__(rate, depth, depth if delay is None else delay, mix, voices)
+
+class Flanger(ModulatedDelay):
+    def __init__(self, rate: float = 0.25, depth: float = 0.002, mix: float = 0.5, delay: float = 0.003):
+        super().__init__(rate, depth, delay, mix)
+
+class Vibrato(ModulatedDelay):
+    def __init__(self, rate: float = 5.0, depth: float = 0.0005):
+        super().__init__(rate, depth, depth, mix=1.0)
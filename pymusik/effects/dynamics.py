@@ -0,0 +1,114 @@
+import numpy as np
+from typing import Optional
+from ..utils.math import float_dtype
+
+# The release recursion is unrolled with powers of its decay factor; segments are kept short
+# enough that those powers stay well inside float64 range
+MAX_DECAY_EXPONENT = 600.0
+
+def window_max(x: np.ndarray, size: int) -> np.ndarray:
+    # max(x[j:j + size]) for every j in range(len(x) - size + 1), in O(len(x)) (van Herk/Gil-Werman)
+    if size <= 1:
+        return x.copy()
+    n = len(x)
+    pad = (-n) % size
+    chunks = np.concatenate([x, np.full(pad, -np.inf)]).reshape(-1, size)
+    prefix = np.maximum.accumulate(chunks, axis=1).ravel()
+    suffix = np.maximum.accumulate(chunks[:, ::-1], axis=1)[:, ::-1].ravel()
+    j = np.arange(n - size + 1)
+    return np.maximum(suffix[j], prefix[j + size - 1])
+
+class LookaheadLimiter:
+    # Master-bus peak limiter for audio arriving in blocks. The optional soft clip is the
+    # old master saturation, tanh(x * drive). The limiter then works on the gain reduction
+    # needed to keep every sample under `ceiling`: held over the lookahead window, ramped in
+    # with a box filter over the same window (the attack), and let go exponentially with
+    # time constant `release`. Output is delayed by the lookahead.
+    def __init__(self, ceiling: float = 0.98, attack: float = 0.005, release: float = 0.1,
+                 soft_clip: bool = True, drive: float = 1.2):
+        self.ceiling = ceiling
+        self.attack = attack
+        self.release = release
+        self.soft_clip = soft_clip
+        self.drive = drive
+        self._sample_rate: Optional[int] = None
+
+    def lookahead_samples(self, sample_rate: int) -> int:
+        return max(int(round(self.attack * sample_rate)), 0)
+
+    def reset(self):
+        self._sample_rate = None
+
+    def _start(self, sample_rate: int):
+        delay = self.lookahead_samples(sample_rate)
+        self._sample_rate = sample_rate
+        # The last `delay` samples of input, required reduction and held reduction
+        self._input = np.zeros(delay)
+        self._required = np.zeros(delay)
+        self._held = np.zeros(delay)
+        self._reduction = 0.0
+        self._dtype = np.dtype(np.float64)
+
+    def process_block(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
+        # Returns as many samples as it is given, `lookahead_samples` behind the input
+        if self._sample_rate != sample_rate:
+            self._start(sample_rate)
+        dtype = self._dtype = float_dtype(data)
+        if not len(data):
+            return np.zeros(0, dtype=dtype)
+        x = np.asarray(data, dtype=np.float64)
+        if self.soft_clip:
+            x = np.tanh(x * self.drive)
+        delay = len(self._input)
+        size = delay + 1
+
+        # Gain reduction in nepers (-ln gain), so holding and averaging it keeps the guarantee
+        required = np.log(np.maximum(np.abs(x) / self.ceiling, 1.0))
+        held = window_max(np.concatenate([self._required, required]), size)
+        sums = np.concatenate([[0.0], np.cumsum(np.concatenate([self._held, held]))])
+        reduction = self._release((sums[size:] - sums[:-size]) / size, sample_rate)
+
+        delayed = np.concatenate([self._input, x])
+        out = delayed[:len(x)] * np.exp(-reduction)
+        np.clip(out, -self.ceiling, self.ceiling, out=out)
+
+        if delay:
+            self._input = delayed[-delay:]
+            self._required = np.concatenate([self._required, required])[-delay:]
+            self._held = np.concatenate([self._held, held])[-delay:]
+        return out.astype(dtype, copy=False)
+
+    def flush(self, sample_rate: int) -> np.ndarray:
+        # The last lookahead_samples of output, still held in the delay line
+        if self._sample_rate != sample_rate:
+            self._start(sample_rate)
+        delay = len(self._input)
+        soft_clip, self.soft_clip = self.soft_clip, False
+        try:
+            return self.process_block(np.zeros(delay, dtype=self._dtype), sample_rate)
+        finally:
+            self.soft_clip = soft_clip
+
+    def _release(self, required: np.ndarray, sample_rate: int) -> np.ndarray:
+        # out[n] = max(required[n], out[n - 1] * k): the reduction drops no faster than exp(-t / release).
+        # Unrolled as a running max of required[m] * k^(n - m).
+        if self.release <= 0:
+            self._reduction = float(required[-1])
+            return required
+        rate = 1.0 / (self.release * sample_rate)
+        segment = max(int(MAX_DECAY_EXPONENT / rate), 1)
+        out = np.empty_like(required)
+        for start in range(0, len(required), segment):
+            part = required[start:start + segment]
+            steps = np.arange(len(part)) * rate
+            decayed = np.maximum.accumulate(part * np.exp(steps)) * np.exp(-steps)
+            np.maximum(decayed, self._reduction * np.exp(-(steps + rate)), out=decayed)
+            np.maximum(decayed, part, out=out[start:start + len(part)])
+            self._reduction = float(out[start + len(part) - 1])
+        return out
+
+    def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
+        # A whole buffer at once, lined up with the input (the lookahead delay is removed)
+        self.reset()
+        out = np.concatenate([self.process_block(data, sample_rate), self.flush(sample_rate)])
+        return out[self.lookahead_samples(sample_rate):]
@@ -1,10 +1,11 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 import numpy as np
 from ..instruments.base import Instrument
 from ..composition.pattern import Pattern
 from ..core.time import TimeContext
-from ..core.events import NoteEvent, Event
-from ..core.pitch import Note, Rest
+from ..core.constants import DEFAULT_RENDER_DTYPE
+from ..core.events import NoteEvent, Event, EventStore
+from .sidechain import Sidechain
 
 class Track:
     def __init__(self, name: str, instrument: Instrument):
@@ -12,46 +13,65 @@ class Track:
         self.instrument = instrument
         self.pattern: Optional[Pattern] = None
         self.gain: float = 0.8
-        self.sidechain: bool = False
-        
+        # True pumps on the beat grid; a Sidechain ducks from another track's notes or audio
+        self.sidechain: Union[bool, Sidechain] = False
+        # A frozen track keeps mixing its last rendered stem until unfreeze()
+        self.frozen: bool = False
+        self._compiled: Dict[tuple, EventStore] = {}
+        self._compiled_signature = None
+        # (fingerprint, stem) from the last render, reused while the fingerprint matches
+        self._stem: Optional[Tuple[tuple, np.ndarray]] = None
+
+    def __getstate__(self):
+        # Render workers never need the cached stem
+        state = self.__dict__.copy()
+        state["_stem"] = None
+        return state
+
     def set_pattern(self, pattern: Pattern):
         self.pattern = pattern
 
+    def compile_events(self, total_beats: Optional[float] = None,
+                       time_context: Optional[TimeContext] = None) -> EventStore:
+        # Columnar events, cached until the pattern, song length or tempo changes
+        pattern = self.pattern if self.pattern is not None else Pattern()
+        signature = (pattern, pattern.signature())
+        if signature != self._compiled_signature:
+            self._compiled_signature = signature
+            self._compiled.clear()
+
+        key = (total_beats, time_context and (time_context.bpm, time_context.sample_rate))
+        store = self._compiled.get(key)
+        if store is None:
+            store = pattern.compile(total_beats)
+            if time_context is not None:
+                store.onset_samples = time_context.beats_to_samples_array(store.time)
+            self._compiled[key] = store
+        return store
+
+    def freeze(self):
+        # Pins the stem: the next render keeps it (rendering one first if there is none yet)
+        # and later edits to the pattern, instrument or gain are ignored until unfreeze()
+        self.frozen = True
+
+    def unfreeze(self):
+        self.frozen = False
+
+    def clear_stem(self):
+        self._stem = None
+
+    @property
+    def stem(self) -> Optional[np.ndarray]:
+        return self._stem[1] if self._stem is not None else None
+
     def get_events(self, total_beats: Optional[float] = None) -> List[NoteEvent]:
-        events = []
-        if not self.pattern or not self.pattern.elements:
-            return events
-            
-        current_time = 0.0
-        pattern_duration = self.pattern.duration
-        
-        while True:
-            for el in self.pattern.elements:
-                event_time = current_time
-                if isinstance(el, Note):
-                    events.append(NoteEvent(time=event_time, note=el))
-                    current_time += el.duration
-                elif isinstance(el, Rest):
-                    current_time += el.duration
-                
-                if total_beats is not None and current_time >= total_beats:
-                    return events
-            
-            if not self.pattern.loop:
-                break
-            
-            if pattern_duration <= 0:
-                break
-                
-            if total_beats is None:
-                break
-                
-        return events
+        return self.compile_events(total_beats).events()
 
 class Song:
-    def __init__(self, name: str = "Untitled", bpm: float = 120.0, sample_rate: int = 44100, duration_beats: Optional[float] = None):
+    def __init__(self, name: str = "Untitled", bpm: float = 120.0, sample_rate: int = 44100, duration_beats: Optional[float] = None,
+                 dtype=DEFAULT_RENDER_DTYPE):
         self.name = name
-        self.time_context = TimeContext(bpm=bpm, sample_rate=sample_rate)
+        self.time_context = TimeContext(bpm=bpm, sample_rate=sample_rate, dtype=dtype)
         self.tracks: List[Track] = []
         self.duration_beats = duration_beats
 
@@ -64,24 +84,30 @@ class Song:
         if self.duration_beats is not None:
             return self.duration_beats
             
-        max_duration = 0.0
-        for track in self.tracks:
-            events = track.get_events()
-            if events:
-                last_event = events[-1]
-                max_duration = max(max_duration, last_event.time + last_event.duration)
-        return max_duration
-
-    def render(self, filename: str, sample_rate: Optional[int] = None):
+        return max((track.compile_events().end_beats for track in self.tracks), default=0.0)
+
+    def render(self, filename: str, sample_rate: Optional[int] = None, bit_depth: int = 16, dither: bool = False,
+               workers: int = 1, threads: int = 1, seed: Optional[int] = None,
+               memory_budget: Optional[int] = None, scratch_dir: Optional[str] = None, limiter=None,
+               cache_stems: bool = False):
         from .renderer import Renderer
         from ..output.audio import save_wav
         
         if sample_rate:
             self.time_context.sample_rate = sample_rate
             
-        renderer = Renderer(self)
+        renderer = Renderer(self, workers=workers, threads=threads, seed=seed,
+                            memory_budget=memory_budget, scratch_dir=scratch_dir, limiter=limiter,
+                            cache_stems=cache_stems)
         audio_data = renderer.render()
-        save_wav(filename, audio_data, self.time_context.sample_rate)
+        save_wav(filename, audio_data, self.time_context.sample_rate, bit_depth, dither)
+
+    def render_stems(self, directory: str, bit_depth: int = 16, dither: bool = False,
+                     threads: int = 1, seed: Optional[int] = None, cache_stems: bool = False) -> Dict[str, str]:
+        # Every track's stem plus master.wav from a single pass; returns track name -> path
+        from .renderer import Renderer
+        renderer = Renderer(self, threads=threads, seed=seed, cache_stems=cache_stems)
+        return renderer.render_stems(directory, bit_depth, dither)
 
     def export_midi(self, filename: str):
         from ..output.midi import export_midi
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Tuple
+import numpy as np
+from ..instruments.base import Instrument
+from ..core.time import TimeContext
+from ..core.events import NoteEvent
+from ..core.pitch import Note
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+class NoteCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._buffers: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        # Notes of one track may be rendered from several threads
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self.nbytes = 0
+
+    def key(self, instrument: Instrument, note_event: NoteEvent, time_context: TimeContext) -> Tuple:
+        note = note_event.note
+        return (
+            instrument.cache_key(),
+            note.pitch.midi,
+            time_context.beats_to_samples(note.duration),
+            time_context.sample_rate,
+            None if instrument.velocity_linear else note.velocity,
+        )
+
+    def render(self, instrument: Instrument, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
+        if not instrument.cacheable:
+            return instrument.process_note(note_event, time_context)
+
+        # Instruments that aren't linear in velocity are cached as played, with no post-gain
+        velocity = note_event.note.velocity if instrument.velocity_linear else 1.0
+        key = self.key(instrument, note_event, time_context)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                self.hits += 1
+                self._buffers.move_to_end(key)
+            else:
+                self.misses += 1
+        if buffer is not None:
+            return buffer * velocity
+
+        if instrument.velocity_linear:
+            # Rendered at full velocity and scaled to each note's
+            unit_note = Note(note_event.note.pitch, note_event.note.duration, 1.0)
+            note_event = NoteEvent(time=note_event.time, note=unit_note, seed=note_event.seed)
+        buffer = np.asarray(instrument.process_note(note_event, time_context), dtype=time_context.dtype)
+        with self._lock:
+            self._store(key, buffer)
+        return buffer * velocity
+
+    def _store(self, key: Hashable, buffer: np.ndarray):
+        if buffer.nbytes > self.max_bytes or key in self._buffers:
+            return
+        self._buffers[key] = buffer
+        self.nbytes += buffer.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._buffers.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def __repr__(self):
+        return f"NoteCache(entries={len(self)}, bytes={self.nbytes}, hits={self.hits}, misses={self.misses})"
@@ -0,0 +1,38 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional
+from .audio_graph import Track
+from ..core.events import EventStore
+
+@dataclass
+class TrackPlan:
+    track: Track
+    # Columnar events; NoteEvents are only built for the notes that are synthesised
+    store: EventStore
+    # Start sample and promised length of each event, from Instrument.note_length()
+    starts: np.ndarray
+    lengths: np.ndarray
+    # Set for looped patterns: events repeat in groups of this many notes
+    notes_per_loop: Optional[int] = None
+    # Position in the song, part of every note's noise seed
+    index: int = 0
+
+    @property
+    def end(self) -> int:
+        return int(np.max(self.starts + self.lengths)) if len(self.starts) else 0
+
+@dataclass
+class RenderPlan:
+    total_beats: float
+    # Song length plus one second of padding; the sidechain pumps only up to here
+    base_length: int
+    sample_rate: int
+    tracks: List[TrackPlan]
+
+    @property
+    def length(self) -> int:
+        return max([self.base_length] + [t.end for t in self.tracks])
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.length / self.sample_rate
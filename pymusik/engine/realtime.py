@@ -0,0 +1,234 @@
+import heapq
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from .audio_graph import Song
+from .note_cache import NoteCache
+from .renderer import BlockMixer, Renderer
+from ..effects.dynamics import LookaheadLimiter
+from ..output.sinks import AudioSink, NullSink
+
+@dataclass
+class RealtimeMetrics:
+    block_size: int
+    sample_rate: int
+    blocks: int = 0
+    underruns: int = 0
+    # Seconds spent mixing each block on the audio thread
+    callback_times: List[float] = field(default_factory=list)
+    # Worst time from a block falling due to it reaching the sink
+    max_latency: float = 0.0
+    # Seconds the scheduler spent rendering notes
+    render_time: float = 0.0
+
+    @property
+    def period(self) -> float:
+        # The budget for one callback
+        return self.block_size / self.sample_rate
+
+    @property
+    def audio_seconds(self) -> float:
+        return self.blocks * self.period
+
+    @property
+    def mean_callback(self) -> float:
+        return float(np.mean(self.callback_times)) if self.callback_times else 0.0
+
+    @property
+    def max_callback(self) -> float:
+        return max(self.callback_times, default=0.0)
+
+    @property
+    def load(self) -> float:
+        # Share of real time the engine needed; above 1 it cannot keep up
+        if not self.blocks:
+            return 0.0
+        return (self.render_time + sum(self.callback_times)) / self.audio_seconds
+
+    @property
+    def meets_budget(self) -> bool:
+        return self.underruns == 0 and self.max_callback < self.period and self.load < 1.0
+
+    def __repr__(self):
+        return (f"RealtimeMetrics(blocks={self.blocks}, underruns={self.underruns}, "
+                f"mean_callback={self.mean_callback * 1e3:.3f}ms, max_callback={self.max_callback * 1e3:.3f}ms, "
+                f"max_latency={self.max_latency * 1e3:.3f}ms, load={self.load:.2f})")
+
+def _tagged(track_index: int, placements: Iterator[Tuple[int, np.ndarray]]) -> Iterator[Tuple[int, int, np.ndarray]]:
+    for start_sample, signal in placements:
+        yield start_sample, track_index, signal
+
+class RealtimeEngine:
+    # Plays a song block by block. A scheduler thread renders notes up to `lookahead`
+    # seconds ahead of the playhead into a queue; the audio thread only mixes what is
+    # queued, so a slow note costs lookahead rather than an audible gap.
+    def __init__(self, song: Song, sink: Optional[AudioSink] = None, block_size: int = 512,
+                 lookahead: float = 0.2, note_cache: Optional[NoteCache] = None, threads: int = 1,
+                 seed: Optional[int] = None, realtime: bool = True, limiter: Optional[LookaheadLimiter] = None):
+        self.song = song
+        self.sink = sink if sink is not None else NullSink()
+        self.block_size = block_size
+        self.lookahead = lookahead
+        # False runs as fast as possible and waits for the scheduler instead of underrunning;
+        # the metrics then tell whether the song would have kept up
+        self.realtime = realtime
+        self.renderer = Renderer(song, note_cache=note_cache, threads=threads, seed=seed, limiter=limiter)
+        self.metrics = RealtimeMetrics(block_size, song.time_context.sample_rate)
+
+        self.playhead = 0
+        # Every placement starting before this sample is in the queue
+        self.rendered_until = 0
+        self._queue: "deque[Tuple[int, int, np.ndarray]]" = deque()
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._scheduler_done = False
+        self._error: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def lookahead_samples(self) -> int:
+        # At least one block, or the audio thread would wait for notes the scheduler won't render yet
+        return max(int(self.lookahead * self.song.time_context.sample_rate), self.block_size)
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        if self.running:
+            raise RuntimeError("RealtimeEngine is already running")
+        self.plan = self.renderer.plan()
+        self.metrics = RealtimeMetrics(self.block_size, self.plan.sample_rate)
+        self.playhead = 0
+        self.rendered_until = 0
+        self._queue.clear()
+        self._stopping.clear()
+        self._scheduler_done = False
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._schedule, name="pymusik-scheduler", daemon=True),
+            threading.Thread(target=self._play, name="pymusik-audio", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.join()
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self) -> RealtimeMetrics:
+        # Plays the whole song and blocks until it has finished
+        self.start()
+        try:
+            self.join()
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        if self._error is not None:
+            raise self._error
+        return self.metrics
+
+    def _schedule(self):
+        try:
+            sources = [_tagged(i, self.renderer.placements(track_plan))
+                       for i, track_plan in enumerate(self.plan.tracks)]
+            placements = heapq.merge(*sources, key=itemgetter(0))
+            while not self._stopping.is_set():
+                with self._cond:
+                    while (not self._stopping.is_set()
+                           and self.rendered_until >= self.playhead + self.lookahead_samples):
+                        self._cond.wait()
+                tic = time.perf_counter()
+                placement = next(placements, None)
+                self.metrics.render_time += time.perf_counter() - tic
+                with self._cond:
+                    if placement is None:
+                        self.rendered_until = self.plan.length
+                        break
+                    self._queue.append(placement)
+                    # Placements come in onset order, so everything before this one is queued
+                    self.rendered_until = placement[0]
+                    self._cond.notify_all()
+        except BaseException as e:
+            self._error = e
+            self._stopping.set()
+        finally:
+            with self._cond:
+                self._scheduler_done = True
+                self._cond.notify_all()
+
+    def _ready(self, end: int) -> bool:
+        return self._scheduler_done or self.rendered_until >= end
+
+    def _play(self):
+        plan = self.plan
+        mixer = BlockMixer(self.renderer, plan)
+        period = self.metrics.period
+        # The sink's own clock paces a sound card; otherwise we keep time ourselves
+        paced = self.sink.paced or not self.realtime
+        # The master limiter delays the output by its lookahead, which adds to the latency
+        limiter = self.renderer.limiter
+        limiter.reset()
+        self.sink.open(plan.sample_rate, 1)
+        try:
+            with self._cond:
+                # Prefill the lookahead before the clock starts
+                self._cond.wait_for(lambda: self._stopping.is_set()
+                                    or self._ready(min(self.lookahead_samples, plan.length)))
+            clock = time.perf_counter()
+            for k, start in enumerate(range(0, plan.length, self.block_size)):
+                if self._stopping.is_set():
+                    break
+                end = min(start + self.block_size, plan.length)
+                due = clock + k * period
+                if not paced:
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    due = time.perf_counter()
+
+                tic = time.perf_counter()
+                with self._cond:
+                    if not self.realtime:
+                        self._cond.wait_for(lambda: self._stopping.is_set() or self._ready(end))
+                    starved = not self._ready(end)
+                    while self._queue and self._queue[0][0] < end:
+                        start_sample, track_index, signal = self._queue.popleft()
+                        mixer.add(track_index, start_sample, signal)
+                block = limiter.process_block(mixer.mix(start, end), plan.sample_rate)
+                toc = time.perf_counter()
+
+                self.sink.write(block)
+                handed_over = time.perf_counter()
+                with self._cond:
+                    self.playhead = end
+                    self._cond.notify_all()
+
+                self.metrics.blocks += 1
+                self.metrics.callback_times.append(toc - tic)
+                self.metrics.max_latency = max(self.metrics.max_latency, handed_over - due)
+                # Missing notes, or a block that was not ready before the next one fell due
+                if starved or (self.realtime and not self.sink.paced and toc > due + period):
+                    self.metrics.underruns += 1
+            else:
+                # Played to the end: let the limiter's delay line run out
+                self.sink.write(limiter.flush(plan.sample_rate))
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+        finally:
+            self._stopping.set()
+            with self._cond:
+                self._cond.notify_all()
+            self.sink.close()
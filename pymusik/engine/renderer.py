@@ -1,50 +1,669 @@
+import os
+import re
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
 from .audio_graph import Song
+from .note_cache import NoteCache
+from .plan import RenderPlan, TrackPlan
+from .sidechain import FollowerDucker, GridDucker, OnsetDucker
+from ..core.events import NoteEvent
+from ..effects.dynamics import LookaheadLimiter
+from ..utils.fingerprint import parameter_fingerprint
+from ..utils.scratch import mapped_zeros, release
+
+# How many notes each render thread may have finished or in flight ahead of the mixdown
+NOTES_AHEAD_PER_THREAD = 4
+
+# Samples per pass when a full-length buffer is scaled, copied or written out
+MIX_CHUNK_SAMPLES = 65536
+
+# Set in each pool process by _init_track_worker
+_worker_renderer: Optional["Renderer"] = None
+
+def _init_track_worker(renderer: "Renderer"):
+    global _worker_renderer
+    # Forked workers would otherwise all continue the parent's noise sequence
+    np.random.seed()
+    _worker_renderer = renderer
+
+def _render_track_to_shared_memory(track_plan: TrackPlan, plan: RenderPlan) -> str:
+    # The stem is rendered straight into shared memory rather than being pickled back
+    dtype = _worker_renderer.song.time_context.dtype
+    shm = shared_memory.SharedMemory(create=True, size=max(plan.length * dtype.itemsize, 1))
+    # Fresh shared memory is zero-filled
+    stem = np.ndarray((plan.length,), dtype=dtype, buffer=shm.buf)
+    _worker_renderer.render_track(track_plan, plan, out=stem)
+    del stem
+    shm.close()
+    return shm.name
+
+def _accumulate(dst: np.ndarray, src: np.ndarray):
+    # dst[:len(src)] += src, a chunk at a time so mapped buffers are never resident whole
+    for start in range(0, len(src), MIX_CHUNK_SAMPLES):
+        end = min(start + MIX_CHUNK_SAMPLES, len(src))
+        dst[start:end] += src[start:end]
+        release(dst, start, end)
+        release(src, start, end)
+
+def _clear(buffer: np.ndarray):
+    for start in range(0, len(buffer), MIX_CHUNK_SAMPLES):
+        buffer[start:start + MIX_CHUNK_SAMPLES] = 0
+        release(buffer, start, start + MIX_CHUNK_SAMPLES)
+
+def _check_length(instrument, note_signal: np.ndarray, expected: int):
+    if len(note_signal) != expected:
+        raise ValueError(f"{instrument!r} rendered {len(note_signal)} samples "
+                         f"but its note_length() promised {expected}")
 
 class Renderer:
-    def __init__(self, song: Song):
+    def __init__(self, song: Song, note_cache: Optional[NoteCache] = None, workers: int = 1,
+                 threads: int = 1, seed: Optional[int] = None, cache_stems: bool = False,
+                 memory_budget: Optional[int] = None, scratch_dir: Optional[str] = None,
+                 limiter: Optional[LookaheadLimiter] = None):
         self.song = song
+        self.note_cache = note_cache
+        # Tracks are rendered in this many processes; 1 renders in-process
+        self.workers = workers
+        # Notes within a track are rendered on this many threads
+        self.threads = threads
+        # Base for per-note noise seeds; threaded renders are always seeded (from 0 by default)
+        self.seed = seed
+        # Keep each track's rendered stem on the track and only re-render tracks that changed.
+        # Off by default: kept stems are full-length copies that outlive the render. Frozen
+        # tracks keep theirs either way.
+        self.cache_stems = cache_stems
+        self.stems_reused = 0
+        self.stems_rendered = 0
+        # Bytes of full-length buffers a render may hold in RAM; past it they are memory-mapped
+        # scratch files in `scratch_dir` (the system temp directory by default)
+        self.memory_budget = memory_budget
+        self.scratch_dir = scratch_dir
+        self.resident_bytes = 0
+        # Master bus: soft clip and look-ahead peak limiter, shared by every render path
+        self.limiter = limiter if limiter is not None else LookaheadLimiter()
+        # Finished trigger tracks of follower sidechains, by track index, kept during a render
+        # until the last follower that reads them has been rendered
+        self._trigger_audio: Dict[int, np.ndarray] = {}
+
+    def allocate(self, length: int) -> np.ndarray:
+        # A zeroed full-length buffer, in RAM while it fits the memory budget
+        dtype = self.song.time_context.dtype
+        nbytes = length * dtype.itemsize
+        if self.memory_budget is None or self.resident_bytes + nbytes <= self.memory_budget:
+            self.resident_bytes += nbytes
+            return np.zeros(length, dtype=dtype)
+        return mapped_zeros(length, dtype, self.scratch_dir)
 
-    def render(self) -> np.ndarray:
+    def render_note(self, instrument, event) -> np.ndarray:
+        ctx = self.song.time_context
+        if self.note_cache is not None:
+            note_signal = self.note_cache.render(instrument, event, ctx)
+        else:
+            note_signal = instrument.process_note(event, ctx)
+        return np.asarray(note_signal, dtype=ctx.dtype)
+
+    def render_group(self, instrument, events: List[NoteEvent]) -> np.ndarray:
+        # One note, or the mix of a chord's notes from the instrument's batched path
+        if len(events) == 1:
+            return self.render_note(instrument, events[0])
+        ctx = self.song.time_context
+        return np.asarray(instrument.process_notes_batch(events, ctx), dtype=ctx.dtype)
+
+    def note_event(self, track_plan: TrackPlan, i: int) -> NoteEvent:
+        # Each note's noise depends only on (seed, track, event index), never on scheduling
+        seed = None
+        if self.seed is not None or self.threads > 1:
+            seed = int(np.random.SeedSequence([self.seed or 0, track_plan.index, i]).generate_state(1)[0])
+        return track_plan.store.event(i, seed)
+
+    def note_signals(self, instrument, groups: List[List[NoteEvent]]) -> Iterator[Tuple[List[NoteEvent], np.ndarray]]:
+        # Rendered note groups in event order; with threads, a bounded window renders ahead
+        if self.threads <= 1:
+            for group in groups:
+                yield group, self.render_group(instrument, group)
+            return
+
+        window = deque()
+        with ThreadPoolExecutor(self.threads) as pool:
+            for group in groups:
+                window.append((group, pool.submit(self.render_group, instrument, group)))
+                if len(window) >= self.threads * NOTES_AHEAD_PER_THREAD:
+                    group, future = window.popleft()
+                    yield group, future.result()
+            while window:
+                group, future = window.popleft()
+                yield group, future.result()
+
+    def note_groups(self, track_plan: TrackPlan, stop: Optional[int] = None) -> List[List[int]]:
+        # Indices of the events rendered together. Notes with the same onset and length (a chord)
+        # form one group when the instrument has a batched path; otherwise every note is its own.
+        stop = len(track_plan.starts) if stop is None else stop
+        if not track_plan.track.instrument.batches_notes:
+            return [[i] for i in range(stop)]
+        groups = []
+        keys = zip(track_plan.starts[:stop].tolist(), track_plan.lengths[:stop].tolist(),
+                   track_plan.store.duration[:stop].tolist())
+        for i, key in enumerate(keys):
+            if groups and key == groups[-1][0]:
+                groups[-1][1].append(i)
+            else:
+                groups.append((key, [i]))
+        return [indices for _, indices in groups]
+
+    def plan(self) -> RenderPlan:
+        # Compiles every track's events and asks each instrument how long its notes
+        # will be, so the final length is known before anything is rendered. A note's length
+        # only depends on the pattern note it plays, so it is asked once per pattern note.
+        ctx = self.song.time_context
         total_beats = self.song.get_total_duration_beats()
-        total_samples = self.song.time_context.beats_to_samples(total_beats)
-        
-        padding_samples = self.song.time_context.sample_rate * 1
-        master_buffer = np.zeros(total_samples + padding_samples)
-        
-        # Ducking Envelope for Sidechain (Techno Pumping)
-        duck_size = len(master_buffer)
-        t_duck = np.arange(duck_size) / self.song.time_context.sample_rate
-        beat_pos = (t_duck * (self.song.time_context.bpm / 60.0)) % 1.0
-        duck_env = 1.0 - 0.8 * np.exp(-4.0 * beat_pos)
-
-        for track in self.song.tracks:
-            track_buffer = np.zeros(len(master_buffer))
-            events = track.get_events(total_beats=total_beats)
-            for event in events:
-                start_sample = self.song.time_context.beats_to_samples(event.time)
-                note_signal = track.instrument.process_note(event, self.song.time_context)
-                
-                if len(note_signal) == 0: continue
-                
-                end_sample = start_sample + len(note_signal)
-                if end_sample > len(track_buffer):
-                    track_buffer = np.pad(track_buffer, (0, end_sample - len(track_buffer)))
-                    if len(track_buffer) > len(master_buffer):
-                        master_buffer = np.pad(master_buffer, (0, len(track_buffer) - len(master_buffer)))
-                        duck_env = np.pad(duck_env, (0, len(track_buffer) - len(duck_env)), constant_values=1.0)
-
-                track_buffer[start_sample:end_sample] += note_signal * track.gain
-            
-            if track.sidechain:
-                track_buffer *= duck_env[:len(track_buffer)]
-            
-            master_buffer[:len(track_buffer)] += track_buffer
-                
-        # Master Limiter / Soft Saturation
-        master_buffer = np.tanh(master_buffer * 1.2) # Saturate for warmth
-        max_val = np.max(np.abs(master_buffer))
-        if max_val > 0.98:
-            master_buffer /= (max_val / 0.98)
-            
+        base_length = ctx.beats_to_samples(total_beats) + ctx.sample_rate * 1
+        tracks = []
+        for i, track in enumerate(self.song.tracks):
+            store = track.compile_events(total_beats, ctx)
+            note_lengths = np.array([track.instrument.note_length(NoteEvent(time=0.0, note=note), ctx)
+                                     for note in store.notes], dtype=np.int64)
+            lengths = note_lengths[store.note_index] if len(store) else np.zeros(0, dtype=np.int64)
+            tracks.append(TrackPlan(track, store, store.onset_samples, lengths, store.notes_per_loop, i))
+        plan = RenderPlan(total_beats, base_length, ctx.sample_rate, tracks)
+        # Fails early on a missing trigger track or a cycle of sidechain followers
+        self.render_order(plan)
+        return plan
+
+    def render(self, plan: Optional[RenderPlan] = None) -> np.ndarray:
+        plan = plan or self.plan()
+        self.resident_bytes = 0
+        master_buffer = self.mix_tracks(plan)
+        return self.master_stage(master_buffer)
+
+    def master_stage(self, master_buffer: np.ndarray) -> np.ndarray:
+        # Master Limiter / Soft Saturation in one pass, in place and a chunk at a time so that a
+        # memory-mapped master is never pulled into RAM whole. The limiter's output lags by its
+        # lookahead, so each chunk is written back that far behind where it was read.
+        sample_rate = self.song.time_context.sample_rate
+        self.limiter.reset()
+        delay = self.limiter.lookahead_samples(sample_rate)
+        length = len(master_buffer)
+        for start in range(0, length, MIX_CHUNK_SAMPLES):
+            limited = self.limiter.process_block(master_buffer[start:start + MIX_CHUNK_SAMPLES], sample_rate)
+            skip = max(delay - start, 0)
+            if len(limited) > skip:
+                master_buffer[start - delay + skip:start - delay + len(limited)] = limited[skip:]
+            release(master_buffer, max(start - delay - MIX_CHUNK_SAMPLES, 0), start - delay)
+        tail = self.limiter.flush(sample_rate)
+        skip = max(delay - length, 0)
+        master_buffer[length - delay + skip:] = tail[skip:]
+        release(master_buffer, max(length - delay - MIX_CHUNK_SAMPLES, 0), length)
+        return master_buffer
+
+    def limit_blocks(self, blocks: Iterator[np.ndarray], block_size: int) -> Iterator[np.ndarray]:
+        # The master stage over a stream of mixed blocks, lined up with them again and re-cut
+        # to block_size; render() gives the same samples
+        sample_rate = self.song.time_context.sample_rate
+        self.limiter.reset()
+        skip = self.limiter.lookahead_samples(sample_rate)
+        pending = np.zeros(0, dtype=self.song.time_context.dtype)
+        for block in blocks:
+            limited = self.limiter.process_block(block, sample_rate)
+            dropped = min(skip, len(limited))
+            skip -= dropped
+            pending = np.concatenate([pending, limited[dropped:]])
+            while len(pending) >= block_size:
+                yield pending[:block_size]
+                pending = pending[block_size:]
+        pending = np.concatenate([pending, self.limiter.flush(sample_rate)[skip:]])
+        for start in range(0, len(pending), block_size):
+            yield pending[start:start + block_size]
+
+    def stem_fingerprint(self, track_index: int, track_plan: TrackPlan, plan: RenderPlan) -> tuple:
+        # Everything a track's stem depends on; while it is unchanged the stem can be reused
+        ctx = self.song.time_context
+        track = track_plan.track
+        pattern = track.pattern
+        seeded = self.seed is not None or self.threads > 1
+        return (
+            pattern.signature() if pattern is not None else None,
+            track.instrument.cache_key(),
+            track.gain,
+            self.sidechain_fingerprint(track_plan, plan),
+            ctx.bpm, ctx.sample_rate, ctx.dtype.str,
+            plan.total_beats, plan.base_length,
+            self.note_cache is not None,
+            (self.seed or 0, track_index) if seeded else None,
+        )
+
+    def sidechain_fingerprint(self, track_plan: TrackPlan, plan: RenderPlan):
+        # A routed sidechain also depends on its trigger: the onsets, or the whole stem for a follower
+        sidechain = track_plan.track.sidechain
+        if isinstance(sidechain, bool):
+            return sidechain
+        trigger = self.trigger_index(track_plan, plan)
+        trigger_plan = plan.tracks[trigger]
+        if sidechain.mode == "follower":
+            source = self.stem_fingerprint(trigger, trigger_plan, plan)
+        else:
+            pattern = trigger_plan.track.pattern
+            source = pattern.signature() if pattern is not None else None
+        return parameter_fingerprint(sidechain), source
+
+    def cached_stem(self, track_index: int, track_plan: TrackPlan, plan: RenderPlan) -> Optional[np.ndarray]:
+        track = track_plan.track
+        if track._stem is None:
+            return None
+        if track.frozen:
+            return track._stem[1]
+        if self.cache_stems and track._stem[0] == self.stem_fingerprint(track_index, track_plan, plan):
+            return track._stem[1]
+        return None
+
+    def dirty_tracks(self, plan: Optional[RenderPlan] = None) -> List[int]:
+        # Indices of the tracks the next render() has to synthesise
+        plan = plan or self.plan()
+        return [i for i, track_plan in enumerate(plan.tracks) if self.cached_stem(i, track_plan, plan) is None]
+
+    def keep_stem(self, track_index: int, track_plan: TrackPlan, plan: RenderPlan, track_buffer: np.ndarray):
+        # Only repeatable tracks are kept, unless the track is frozen; unseeded noise would
+        # otherwise sound the same on every render
+        track = track_plan.track
+        if not (track.frozen or (self.cache_stems and self.repeatable(track_plan))):
+            return
+        stem = self.allocate(min(track_plan.end, plan.length))
+        _accumulate(stem, track_buffer[:len(stem)])
+        track._stem = (self.stem_fingerprint(track_index, track_plan, plan), stem)
+
+    def repeatable(self, track_plan: TrackPlan) -> bool:
+        return track_plan.track.instrument.cacheable or self.seed is not None or self.threads > 1
+
+    def mix_tracks(self, plan: RenderPlan) -> np.ndarray:
+        # Sum of the finished track buffers, added in render order. Tracks whose stem is still
+        # valid (or frozen) are mixed from it without being synthesised again. A follower
+        # sidechain's trigger gets a buffer of its own, kept until its last follower is rendered.
+        dtype = self.song.time_context.dtype
+        master_buffer = self.allocate(plan.length)
+        stems = [self.cached_stem(i, track_plan, plan) for i, track_plan in enumerate(plan.tracks)]
+        dirty = [i for i, stem in enumerate(stems) if stem is None]
+        self.stems_reused += len(plan.tracks) - len(dirty)
+        self.stems_rendered += len(dirty)
+        order = self.render_order(plan)
+        readers = self.trigger_readers(plan, dirty)
+
+        # Followers render here from the kept triggers; the other dirty tracks may go to a pool
+        pooled = [i for i in order if stems[i] is None and not self.follows(plan.tracks[i])]
+        pool = None
+        if self.workers > 1 and len(pooled) > 1:
+            worker_cache = NoteCache(self.note_cache.max_bytes) if self.note_cache else None
+            worker_renderer = Renderer(self.song, worker_cache, threads=self.threads, seed=self.seed)
+            # Workers must share our resource tracker, or each would report the stems we unlink as leaked
+            resource_tracker.ensure_running()
+            pool = ProcessPoolExecutor(min(self.workers, len(pooled)), initializer=_init_track_worker,
+                                       initargs=(worker_renderer,))
+            names = pool.map(_render_track_to_shared_memory, [plan.tracks[i] for i in pooled],
+                             [plan] * len(pooled))
+        else:
+            pooled = []
+
+        # Shared memory of pooled stems still kept as triggers
+        shared: Dict[int, shared_memory.SharedMemory] = {}
+        track_buffer = None
+        self._trigger_audio.clear()
+        try:
+            for i in order:
+                track_plan = plan.tracks[i]
+                shm = None
+                if stems[i] is not None:
+                    # A frozen stem is cut to the song's current length
+                    audio = stems[i][:plan.length]
+                elif i in pooled:
+                    shm = shared_memory.SharedMemory(name=next(names))
+                    audio = np.ndarray((plan.length,), dtype=dtype, buffer=shm.buf)
+                    self.keep_stem(i, track_plan, plan, audio)
+                else:
+                    if i in readers:
+                        out = self.allocate(plan.length)
+                    else:
+                        if track_buffer is None:
+                            track_buffer = self.allocate(plan.length)
+                        _clear(track_buffer)
+                        out = track_buffer
+                    audio = self.render_track(track_plan, plan, out=out)
+                    self.keep_stem(i, track_plan, plan, audio)
+                _accumulate(master_buffer, audio)
+
+                if i in readers:
+                    self._trigger_audio[i] = audio
+                    if shm is not None:
+                        shared[i] = shm
+                        shm = None
+                del audio
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                if stems[i] is None:
+                    for trigger in self.triggers_done(track_plan, plan, readers):
+                        if trigger in shared:
+                            shm = shared.pop(trigger)
+                            shm.close()
+                            shm.unlink()
+        finally:
+            self._trigger_audio.clear()
+            for shm in shared.values():
+                shm.close()
+                shm.unlink()
+            if pool is not None:
+                pool.shutdown()
         return master_buffer
+
+    def render_track(self, track_plan: TrackPlan, plan: RenderPlan, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Adds the track into `out` (zeros of plan.length by default); nothing is reallocated
+        track = track_plan.track
+        track_buffer = out if out is not None else np.zeros(plan.length, dtype=self.song.time_context.dtype)
+        finished = 0
+        for start_sample, signal in self.placements(track_plan):
+            track_buffer[start_sample:start_sample + len(signal)] += signal
+            # Placements come in onset order, so nothing before this one changes again
+            if start_sample - finished >= MIX_CHUNK_SAMPLES:
+                release(track_buffer, finished, start_sample)
+                finished = start_sample
+        
+        ducker = self.ducker(track_plan, plan)
+        if ducker is not None:
+            # Ducking Envelope for Sidechain (Techno Pumping), a chunk at a time and only
+            # where the ducker has anything to do
+            trigger = self.trigger_audio(self.trigger_index(track_plan, plan), plan) if ducker.needs_audio else None
+            for start in range(0, plan.length, MIX_CHUNK_SAMPLES):
+                end = min(start + MIX_CHUNK_SAMPLES, plan.length)
+                duck_env = ducker.envelope(start, end, trigger[start:end] if trigger is not None else None)
+                if duck_env is not None:
+                    track_buffer[start:end] *= duck_env
+                release(track_buffer, start, end)
+        return track_buffer
+
+    def trigger_index(self, track_plan: TrackPlan, plan: RenderPlan) -> int:
+        name = track_plan.track.sidechain.trigger
+        for i, candidate in enumerate(plan.tracks):
+            if candidate.track.name == name:
+                if candidate.track is track_plan.track:
+                    raise ValueError(f"Track {name!r} can't duck itself")
+                return i
+        raise ValueError(f"Sidechain trigger track not found: {name!r}")
+
+    def ducker(self, track_plan: TrackPlan, plan: RenderPlan):
+        # Gain envelope source for the track's sidechain, or None without one
+        sidechain = track_plan.track.sidechain
+        ctx = self.song.time_context
+        if sidechain is False or sidechain is None:
+            return None
+        if sidechain is True:
+            return GridDucker(ctx, plan.base_length)
+        trigger_plan = plan.tracks[self.trigger_index(track_plan, plan)]
+        if sidechain.mode == "follower":
+            return FollowerDucker(sidechain, ctx)
+        onsets = np.asarray(trigger_plan.starts, dtype=np.int64)
+        if sidechain.notes is not None:
+            onsets = onsets[np.isin(trigger_plan.store.midi, sidechain.notes)]
+        return OnsetDucker(sidechain, onsets, ctx)
+
+    def trigger_audio(self, trigger: int, plan: RenderPlan) -> np.ndarray:
+        # The trigger's finished track. mix_tracks and render_stems keep it from when the trigger
+        # was rendered; otherwise it is the trigger's cached stem or, failing that, rendered here.
+        audio = self._trigger_audio.get(trigger)
+        if audio is None:
+            trigger_plan = plan.tracks[trigger]
+            audio = self.cached_stem(trigger, trigger_plan, plan)
+            if audio is None:
+                audio = self.render_track(trigger_plan, plan, out=self.allocate(plan.length))
+                self.keep_stem(trigger, trigger_plan, plan, audio)
+            self._trigger_audio[trigger] = audio
+        return audio
+
+    def follows(self, track_plan: TrackPlan) -> bool:
+        # True for a follower sidechain, which reads its trigger's finished audio
+        sidechain = track_plan.track.sidechain
+        return not isinstance(sidechain, bool) and sidechain is not None and sidechain.mode == "follower"
+
+    def trigger_readers(self, plan: RenderPlan, indices: List[int]) -> Dict[int, int]:
+        # How many of the followers at `indices` read each trigger track
+        readers: Dict[int, int] = {}
+        for i in indices:
+            if self.follows(plan.tracks[i]):
+                trigger = self.trigger_index(plan.tracks[i], plan)
+                readers[trigger] = readers.get(trigger, 0) + 1
+        return readers
+
+    def triggers_done(self, track_plan: TrackPlan, plan: RenderPlan, readers: Dict[int, int]) -> List[int]:
+        # Called once a track is finished; drops the trigger it read once no follower needs it
+        if not self.follows(track_plan):
+            return []
+        trigger = self.trigger_index(track_plan, plan)
+        if trigger not in readers:
+            return []
+        readers[trigger] -= 1
+        if readers[trigger]:
+            return []
+        self._trigger_audio.pop(trigger, None)
+        return [trigger]
+
+    def render_order(self, plan: RenderPlan) -> List[int]:
+        # Track indices with every follower sidechain's trigger before the track it ducks
+        order: List[int] = []
+        state: Dict[int, bool] = {}
+
+        def visit(i: int):
+            if state.get(i) is True:
+                return
+            if state.get(i) is False:
+                raise ValueError(f"Sidechain followers form a cycle through {plan.tracks[i].track.name!r}")
+            state[i] = False
+            if self.follows(plan.tracks[i]):
+                visit(self.trigger_index(plan.tracks[i], plan))
+            state[i] = True
+            order.append(i)
+
+        for i in range(len(plan.tracks)):
+            visit(i)
+        return order
+
+    def placements(self, track_plan: TrackPlan) -> Iterator[Tuple[int, np.ndarray]]:
+        # (start sample, signal with track gain) pairs in onset order, ready to be added
+        instrument = track_plan.track.instrument
+        n = track_plan.notes_per_loop
+        repeats = len(track_plan.starts) // n if n else 0
+        if instrument.cacheable and repeats >= 2:
+            yield from self.loop_placements(track_plan, repeats)
+            return
+
+        groups = self.note_groups(track_plan)
+        for indices, signal in zip(groups, self.group_signals(track_plan, groups)):
+            if len(signal): yield int(track_plan.starts[indices[0]]), signal
+
+    def group_signals(self, track_plan: TrackPlan, groups: List[List[int]]) -> Iterator[np.ndarray]:
+        instrument = track_plan.track.instrument
+        events = [[self.note_event(track_plan, i) for i in indices] for indices in groups]
+        for indices, (_, signal) in zip(groups, self.note_signals(instrument, events)):
+            _check_length(instrument, signal, track_plan.lengths[indices[0]])
+            yield signal * track_plan.track.gain
+
+    def loop_placements(self, track_plan: TrackPlan, repeats: int) -> Iterator[Tuple[int, np.ndarray]]:
+        # Every repetition of a repeatable loop sounds the same, so only the first one is rendered.
+        # Repetitions whose notes all land the same number of samples after the first one's get
+        # the whole period, tails included, as one pre-mixed tile; the others (a tempo whose
+        # beat isn't a whole number of samples can jitter onsets by one) reuse the notes one by one.
+        n = track_plan.notes_per_loop
+        starts = np.asarray(track_plan.starts, dtype=np.int64)
+        groups = self.note_groups(track_plan, n)
+        signals = list(self.group_signals(track_plan, groups))
+        firsts = [indices[0] for indices in groups]
+
+        origin = track_plan.starts[0]
+        tile = np.zeros(max(track_plan.starts[i] + len(signal) for i, signal in zip(firsts, signals)) - origin,
+                        dtype=self.song.time_context.dtype)
+        for i, signal in zip(firsts, signals):
+            tile[track_plan.starts[i] - origin:track_plan.starts[i] - origin + len(signal)] += signal
+
+        shifts = starts[:repeats * n].reshape(repeats, n) - starts[:n]
+        uniform = (shifts == shifts[:, :1]).all(axis=1)
+        for k in range(repeats):
+            if uniform[k]:
+                if len(tile): yield int(starts[k * n]), tile
+                continue
+            for i, signal in zip(firsts, signals):
+                if len(signal): yield int(starts[k * n + i]), signal
+        # A last repetition cut short by the end of the song; chords are kept or cut whole
+        for i, signal in zip(firsts, signals):
+            j = repeats * n + i
+            if j < len(starts) and len(signal): yield int(starts[j]), signal
+
+    def iter_blocks(self, block_size: int = 4096) -> Iterator[np.ndarray]:
+        # Streaming render: the same samples as render(). Only notes that are still
+        # ringing are kept in memory.
+        return self.limit_blocks(self.mix_blocks(block_size), block_size)
+
+    def mix_blocks(self, block_size: int = 4096) -> Iterator[np.ndarray]:
+        # The mix before the master stage, block by block
+        plan = self.plan()
+        mixer = BlockMixer(self, plan)
+        sources = [self.placements(track_plan) for track_plan in plan.tracks]
+        upcoming = [next(source, None) for source in sources]
+
+        for start in range(0, plan.length, block_size):
+            end = min(start + block_size, plan.length)
+            for i, source in enumerate(sources):
+                while upcoming[i] is not None and upcoming[i][0] < end:
+                    mixer.add(i, *upcoming[i])
+                    upcoming[i] = next(source, None)
+            yield mixer.mix(start, end)
+
+    def render_stems(self, directory: str, bit_depth: int = 16, dither: bool = False,
+                     master: bool = True) -> Dict[str, str]:
+        # One pass over the song writes every track's stem and the master mix. Tracks are
+        # rendered into a memory-mapped scratch file (in scratch_dir), so memory stays at a few chunks plus
+        # the notes in flight however long the song is. Stem files are flushed after every
+        # chunk and can be read while they are still being written.
+        from ..output.audio import WavWriter
+
+        plan = self.plan()
+        dtype = self.song.time_context.dtype
+        sample_rate = self.song.time_context.sample_rate
+        os.makedirs(directory, exist_ok=True)
+        written: Dict[int, str] = {}
+
+        stems = [self.cached_stem(i, track_plan, plan) for i, track_plan in enumerate(plan.tracks)]
+        readers = self.trigger_readers(plan, [i for i, stem in enumerate(stems) if stem is None])
+        track_buffer = mapped_zeros(plan.length, dtype, self.scratch_dir)
+        master_buffer = mapped_zeros(plan.length, dtype, self.scratch_dir)
+        self._trigger_audio.clear()
+        # Tracks go in render order, so a follower finds its trigger's finished track kept in a
+        # scratch buffer of its own; the master is summed in the same order as render()
+        for i in self.render_order(plan):
+            track_plan = plan.tracks[i]
+            if stems[i] is None:
+                if readers.get(i):
+                    out = mapped_zeros(plan.length, dtype, self.scratch_dir)
+                else:
+                    _clear(track_buffer)
+                    out = track_buffer
+                stem = self.render_track(track_plan, plan, out=out)
+                self.stems_rendered += 1
+                self.triggers_done(track_plan, plan, readers)
+                if readers.get(i):
+                    self._trigger_audio[i] = stem
+            else:
+                if readers.get(i):
+                    self._trigger_audio[i] = stems[i]
+                # Kept stems end with the track's last note; pad them to the song
+                _clear(track_buffer)
+                _accumulate(track_buffer, stems[i][:plan.length])
+                stem = track_buffer
+                self.stems_reused += 1
+
+            path = os.path.join(directory, stem_filename(i, track_plan.track.name))
+            with WavWriter(path, sample_rate, 1, bit_depth, dither) as writer:
+                for start in range(0, plan.length, MIX_CHUNK_SAMPLES):
+                    end = min(start + MIX_CHUNK_SAMPLES, plan.length)
+                    master_buffer[start:end] += stem[start:end]
+                    writer.write(stem[start:end])
+                    writer.flush()
+                    release(master_buffer, start, end)
+                    release(stem, start, end)
+            written[i] = path
+        # Kept trigger scratch files are dropped before the master stage
+        stem = None
+        self._trigger_audio.clear()
+        paths = {plan.tracks[i].track.name: written[i] for i in sorted(written)}
+
+        if master:
+            path = os.path.join(directory, "master.wav")
+            self.master_stage(master_buffer)
+            with WavWriter(path, sample_rate, 1, bit_depth, dither) as writer:
+                for start in range(0, plan.length, MIX_CHUNK_SAMPLES):
+                    writer.write(master_buffer[start:start + MIX_CHUNK_SAMPLES])
+                    writer.flush()
+                    release(master_buffer, start, start + MIX_CHUNK_SAMPLES)
+            paths["master"] = path
+        return paths
+
+    def render_to_wav(self, filename: str, block_size: int = 4096, bit_depth: int = 16, dither: bool = False):
+        # Streams straight to disk, so memory stays at a few blocks for any song length
+        from ..output.audio import WavWriter
+
+        with WavWriter(filename, self.song.time_context.sample_rate, 1, bit_depth, dither) as writer:
+            for block in self.iter_blocks(block_size):
+                writer.write(block)
+
+def stem_filename(track_index: int, name: str) -> str:
+    # Numbered so that stems sort in track order and equal track names can't collide
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("._") or "track"
+    return f"{track_index + 1:02d}-{safe}.wav"
+
+class BlockMixer:
+    # Sums the voices that are still ringing into consecutive blocks, with the same sidechain
+    # as render(); used by iter_blocks and the real-time engine, which add the master stage
+    def __init__(self, renderer: Renderer, plan: RenderPlan):
+        self.renderer = renderer
+        self.plan = plan
+        self.voices: List[List[Tuple[int, np.ndarray]]] = [[] for _ in plan.tracks]
+        self.order = renderer.render_order(plan)
+        self.duckers = [renderer.ducker(track_plan, plan) for track_plan in plan.tracks]
+        self.triggers = [renderer.trigger_index(track_plan, plan) if ducker is not None and ducker.needs_audio else None
+                         for track_plan, ducker in zip(plan.tracks, self.duckers)]
+
+    def add(self, track_index: int, start_sample: int, signal: np.ndarray):
+        self.voices[track_index].append((start_sample, signal))
+
+    def mix(self, start: int, end: int) -> np.ndarray:
+        # Voices that started before `start` only contribute what is left of them. Tracks are
+        # mixed and summed in render order, like render(), so a follower sidechain sees its
+        # trigger's finished block.
+        dtype = self.renderer.song.time_context.dtype
+        blocks: List[Optional[np.ndarray]] = [None] * len(self.plan.tracks)
+
+        for i in self.order:
+            track_block = None
+            if self.voices[i]:
+                track_block = np.zeros(end - start, dtype=dtype)
+                ringing = []
+                for start_sample, note_signal in self.voices[i]:
+                    lo = max(start, start_sample)
+                    hi = min(end, start_sample + len(note_signal))
+                    if hi > lo:
+                        track_block[lo - start:hi - start] += note_signal[lo - start_sample:hi - start_sample]
+                    if start_sample + len(note_signal) > end:
+                        ringing.append((start_sample, note_signal))
+                self.voices[i] = ringing
+
+            ducker = self.duckers[i]
+            # A follower's level has to be tracked even while its own track is silent
+            if ducker is not None and (track_block is not None or ducker.needs_audio):
+                trigger = blocks[self.triggers[i]] if ducker.needs_audio else None
+                duck_env = ducker.envelope(start, end, trigger)
+                if duck_env is not None and track_block is not None:
+                    track_block *= duck_env
+            blocks[i] = track_block
+
+        master_block = np.zeros(end - start, dtype=dtype)
+        for i in self.order:
+            if blocks[i] is not None:
+                master_block += blocks[i]
+        return master_block
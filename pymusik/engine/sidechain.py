@@ -0,0 +1,100 @@
+import numpy as np
+from typing import Optional, Sequence, Union
+from scipy import signal
+from ..core.pitch import Pitch
+from ..core.time import TimeContext
+
+SIDECHAIN_MODES = ("onsets", "follower")
+# Ducks deeper than this below unity are not worth a multiply
+DUCK_FLOOR = 2.0 ** -24
+
+class Sidechain:
+    # Ducks a track from another one (the trigger). "onsets" pumps from the trigger's note
+    # onsets, optionally only some of its notes (the kick of a drum track): the gain drops by
+    # `depth` and recovers as exp(-release * beats since the onset). "follower" ducks by the
+    # level of the trigger's rendered audio, reaching full depth at `threshold`.
+    def __init__(self, trigger: str, notes: Optional[Sequence[Union[str, int]]] = None, depth: float = 0.8,
+                 release: float = 4.0, mode: str = "onsets", threshold: float = 0.5, follow_time: float = 0.05):
+        if mode not in SIDECHAIN_MODES:
+            raise ValueError(f"Unknown sidechain mode: {mode}")
+        self.trigger = trigger
+        self.notes = None if notes is None else tuple(sorted({Pitch(n).midi for n in notes}))
+        self.depth = depth
+        self.release = release
+        self.mode = mode
+        self.threshold = threshold
+        # Seconds for the follower's level to fall to 1/e once the trigger goes quiet
+        self.follow_time = follow_time
+
+    def __repr__(self):
+        return f"Sidechain(trigger={self.trigger!r}, mode={self.mode!r}, depth={self.depth})"
+
+def grid_envelope(start: int, end: int, time_context: TimeContext, length: Optional[int] = None) -> np.ndarray:
+    # Quarter-note pumping for samples [start, end); past `length` the envelope is flat
+    t_duck = np.arange(start, end) / time_context.sample_rate
+    beat_pos = (t_duck * (time_context.bpm / 60.0)) % 1.0
+    duck_env = (1.0 - 0.8 * np.exp(-4.0 * beat_pos)).astype(time_context.dtype, copy=False)
+    if length is not None and end > length:
+        duck_env[max(length - start, 0):] = 1.0
+    return duck_env
+
+class GridDucker:
+    # `track.sidechain = True`: pumps on every beat of the song, whatever is playing
+    needs_audio = False
+
+    def __init__(self, time_context: TimeContext, length: int):
+        self.time_context = time_context
+        self.length = length
+
+    def envelope(self, start: int, end: int, trigger: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        if start >= self.length:
+            return None
+        return grid_envelope(start, end, self.time_context, self.length)
+
+class OnsetDucker:
+    needs_audio = False
+
+    def __init__(self, sidechain: Sidechain, onsets: np.ndarray, time_context: TimeContext):
+        self.onsets = np.unique(np.asarray(onsets, dtype=np.int64))
+        self.depth = sidechain.depth
+        self.rate = sidechain.release / (time_context.seconds_per_beat * time_context.sample_rate)
+        self.dtype = time_context.dtype
+        # Samples after an onset until the duck is within DUCK_FLOOR of unity
+        self.horizon = int(np.ceil(np.log(max(self.depth, DUCK_FLOOR) / DUCK_FLOOR) / self.rate))
+
+    def envelope(self, start: int, end: int, trigger: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        # Only the samples within `horizon` of an onset are computed; None if there are none
+        lo = np.searchsorted(self.onsets, start - self.horizon, side="right")
+        hi = np.searchsorted(self.onsets, end, side="left")
+        if hi <= lo:
+            return None
+        positions = np.arange(start, end)
+        last = np.searchsorted(self.onsets, positions, side="right") - 1
+        since = positions - self.onsets[np.maximum(last, 0)]
+        active = (last >= 0) & (since < self.horizon)
+        env = np.ones(end - start, dtype=self.dtype)
+        env[active] = 1.0 - self.depth * np.exp(-self.rate * since[active])
+        return env
+
+class FollowerDucker:
+    # One-pole smoothing of the trigger's rectified audio; blocks must arrive in order
+    needs_audio = True
+
+    def __init__(self, sidechain: Sidechain, time_context: TimeContext):
+        self.depth = sidechain.depth
+        self.threshold = sidechain.threshold
+        self.pole = float(np.exp(-1.0 / max(sidechain.follow_time * time_context.sample_rate, 1.0)))
+        self.dtype = time_context.dtype
+        self._zi = np.zeros(1)
+
+    def envelope(self, start: int, end: int, trigger: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        # A missing or short trigger block (a stem that ends early) is silence
+        heard = 0 if trigger is None else len(trigger)
+        if not heard and self._zi[0] < DUCK_FLOOR:
+            return None
+        rectified = np.zeros(end - start)
+        if heard:
+            np.abs(trigger, out=rectified[:heard])
+        level, self._zi = signal.lfilter([1.0 - self.pole], [1.0, -self.pole], rectified, zi=self._zi)
+        np.minimum(level / self.threshold, 1.0, out=level)
+        return (1.0 - self.depth * level).astype(self.dtype, copy=False)
@@ -1,15 +1,79 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 import numpy as np
 from ..core.time import TimeContext
 from ..core.events import NoteEvent
+from ..utils.fingerprint import parameter_fingerprint
+from ..utils.math import db_to_linear
+
+# Level below which a decaying note counts as silent and is no longer synthesised
+SILENCE_DB = -90.0
+
+def decay_samples(rate: float, sample_rate: int, peak: float = 1.0, floor_db: float = SILENCE_DB) -> int:
+    # Samples until peak * exp(-rate * t) has fallen below floor_db dBFS
+    return max(int(np.ceil(np.log(peak / db_to_linear(floor_db)) / rate * sample_rate)), 0)
 
 class Instrument(ABC):
+    # Instruments that draw random numbers set this to False; giving them a seed
+    # makes every note repeatable again
+    deterministic = True
+    # Notes are cut where audible_samples() says they have decayed below this level;
+    # None always renders the full duration
+    tail_floor_db: Optional[float] = SILENCE_DB
+    # Output is proportional to note velocity, so the note cache can render once at full
+    # velocity and scale; False caches each velocity separately
+    velocity_linear = True
+
     def __init__(self, sample_rate: int = 44100):
         self.sample_rate = sample_rate
+        self.seed: Optional[int] = None
 
     @abstractmethod
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
         pass
 
+    def process_notes_batch(self, note_events: List[NoteEvent], time_context: TimeContext) -> np.ndarray:
+        # Sum of notes that start together and last equally long (a chord). Instruments that
+        # can synthesise them as one matrix and share the envelope and filter override this.
+        return sum(self.process_note(e, time_context) for e in note_events)
+
+    def time_axis(self, samples: int, dtype=np.float64) -> np.ndarray:
+        # Seconds since the onset. Envelopes can use the render dtype; phases are built from
+        # the float64 axis so that long notes stay in tune
+        return np.arange(samples, dtype=dtype) / self.sample_rate
+
+    @property
+    def batches_notes(self) -> bool:
+        return type(self).process_notes_batch is not Instrument.process_notes_batch
+
+    def note_length(self, note_event: NoteEvent, time_context: TimeContext) -> int:
+        # Exact length of process_note()'s output; instruments that ring past the
+        # note's duration must override this so the renderer can size its buffers
+        samples = max(time_context.beats_to_samples(note_event.note.duration), 0)
+        tail = self.audible_samples(note_event, time_context) if self.tail_floor_db is not None else None
+        return samples if tail is None else min(samples, tail)
+
+    def audible_samples(self, note_event: NoteEvent, time_context: TimeContext) -> Optional[int]:
+        # Samples after which the note stays below tail_floor_db, for instruments that
+        # know their decay. It must not depend on velocity, so cached notes keep their length.
+        return None
+
+    @property
+    def cacheable(self) -> bool:
+        return self.deterministic or self.seed is not None
+
+    def random_source(self, note_event: Optional[NoteEvent] = None):
+        # An instrument seed gives every note the same noise; otherwise a per-note seed from
+        # the renderer is used, and without either the global NumPy generator as before
+        seed = self.seed
+        if seed is None and note_event is not None:
+            seed = note_event.seed
+        if seed is None:
+            return np.random
+        return np.random.RandomState(seed)
+
+    def cache_key(self) -> tuple:
+        return parameter_fingerprint(self)
+
     def __repr__(self):
         return f"{self.__class__.__name__}(sr={self.sample_rate})"
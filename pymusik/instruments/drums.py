@@ -1,47 +1,61 @@
 import numpy as np
-from .base import Instrument
+from .base import Instrument, decay_samples
 from ..core.time import TimeContext
 from ..core.events import NoteEvent
 from ..synthesis.oscillators import SineOscillator, NoiseOscillator
 from ..synthesis.envelopes import ADSREnvelope
 
 class DrumInstrument(Instrument):
+    deterministic = False
+    # Slowest exponential decay of each voice and its peak level before velocity
+    DECAYS = {"kick": (15.0, 1.0), "snare": (15.0, 1.0), "hihat": (100.0, 1.0)}
+
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
 
-    def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
+    def _voice(self, note_event: NoteEvent) -> str:
         note_name = note_event.note.pitch.name
-        
         if "C" in note_name:
-            return self._generate_kick(note_event, time_context)
+            return "kick"
         elif "D" in note_name:
-            return self._generate_snare(note_event, time_context)
+            return "snare"
         elif "F" in note_name:
+            return "hihat"
+        return "kick"
+
+    def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
+        voice = self._voice(note_event)
+        if voice == "snare":
+            return self._generate_snare(note_event, time_context)
+        elif voice == "hihat":
             return self._generate_hihat(note_event, time_context)
-        else:
-            return self._generate_kick(note_event, time_context)
+        return self._generate_kick(note_event, time_context)
+
+    def audible_samples(self, note_event: NoteEvent, time_context: TimeContext) -> int:
+        rate, peak = self.DECAYS[self._voice(note_event)]
+        return decay_samples(rate, self.sample_rate, peak, self.tail_floor_db)
 
     def _generate_kick(self, event, ctx) -> np.ndarray:
-        samples = ctx.beats_to_samples(event.note.duration)
-        t = np.arange(samples) / self.sample_rate
-        freq = 40 + 110 * np.exp(-t * 30)
+        samples = self.note_length(event, ctx)
+        t = self.time_axis(samples, ctx.dtype)
+        freq = 40 + 110 * np.exp(-self.time_axis(samples) * 30)
         phase = 2 * np.pi * np.cumsum(freq) / self.sample_rate
-        out = np.sin(phase)
+        out = np.sin(phase).astype(ctx.dtype)
         env = np.exp(-t * 15)
         return out * env * event.note.velocity
 
     def _generate_snare(self, event, ctx) -> np.ndarray:
-        samples = ctx.beats_to_samples(event.note.duration)
-        t = np.arange(samples) / self.sample_rate
-        body = np.sin(2 * np.pi * 200 * t) * np.exp(-t * 20)
-        noise = np.random.uniform(-1, 1, samples) * np.exp(-t * 15)
+        samples = self.note_length(event, ctx)
+        t = self.time_axis(samples, ctx.dtype)
+        body = np.sin(2 * np.pi * 200 * self.time_axis(samples)).astype(ctx.dtype) * np.exp(-t * 20)
+        noise = self.random_source(event).uniform(-1, 1, samples).astype(ctx.dtype) * np.exp(-t * 15)
         out = 0.4 * body + 0.6 * noise
         return out * event.note.velocity
 
     def _generate_hihat(self, event, ctx) -> np.ndarray:
-        samples = ctx.beats_to_samples(event.note.duration)
-        t = np.arange(samples) / self.sample_rate
-        noise = np.random.uniform(-1, 1, samples)
+        samples = self.note_length(event, ctx)
+        t = self.time_axis(samples, ctx.dtype)
+        noise = self.random_source(event).uniform(-1, 1, samples).astype(ctx.dtype)
         env = np.exp(-t * 100)
         return noise * env * event.note.velocity
 drum_elements = {
@@ -1,26 +1,30 @@
 import numpy as np
-from .base import Instrument
+from typing import List
+from .base import Instrument, decay_samples
 from ..core.time import TimeContext
 from ..core.events import NoteEvent
-from ..synthesis.oscillators import SineOscillator, SquareOscillator
+from ..synthesis.oscillators import SineOscillator, SquareOscillator, UnisonOscillator
 from ..effects.distortion import Distortion
 
 class PhonkCowbell(Instrument):
+    # exp(-15 t) amplitude envelope
+    DECAY_RATE = 15.0
+
+    def audible_samples(self, note_event: NoteEvent, time_context: TimeContext) -> int:
+        return decay_samples(self.DECAY_RATE, self.sample_rate, 1.0, self.tail_floor_db)
+
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
-        samples = time_context.beats_to_samples(note_event.note.duration)
+        samples = self.note_length(note_event, time_context)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
+        t = self.time_axis(samples)
         f = note_event.note.pitch.frequency
         
-        sig = 0.6 * np.sign(np.sin(2 * np.pi * f * t))
-        sig += 0.4 * np.sign(np.sin(2 * np.pi * f * 1.503 * t))
-        
-        env = np.exp(-t * 15)
+        env = np.exp(-self.time_axis(samples, time_context.dtype) * 15)
         
         pitch_env = 1.0 + 0.1 * np.exp(-t * 50)
         phase = 2 * np.pi * f * np.cumsum(pitch_env) / self.sample_rate
-        sig = np.sign(np.sin(phase))
+        sig = np.sign(np.sin(phase)).astype(time_context.dtype)
         
         return sig * env * note_event.note.velocity
 
@@ -29,22 +33,28 @@ class Bass808(Instrument):
         super().__init__(sample_rate)
         self.dist = Distortion(drive=10.0, type="soft")
 
+    def audible_samples(self, note_event: NoteEvent, time_context: TimeContext) -> int:
+        # Sub plus grit peak at 1.3 under an exp(-1.5 t) envelope; the distortion
+        # can raise quiet samples by at most its drive
+        return decay_samples(1.5, self.sample_rate, 0.9 * 1.3 * self.dist.drive, self.tail_floor_db)
+
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
-        samples = time_context.beats_to_samples(note_event.note.duration)
+        samples = self.note_length(note_event, time_context)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
+        t = self.time_axis(samples)
+        env_t = self.time_axis(samples, time_context.dtype)
         f = note_event.note.pitch.frequency
         
         punch_env = 2.0 * np.exp(-t * 40)
         phase = 2 * np.pi * f * (t + np.cumsum(punch_env) / self.sample_rate)
-        sub = np.sin(phase)
+        sub = np.sin(phase).astype(time_context.dtype)
         
-        grit = 0.3 * np.sin(3 * phase) * np.exp(-t * 5)
+        grit = 0.3 * np.sin(3 * phase).astype(time_context.dtype) * np.exp(-env_t * 5)
         
         sig = sub + grit
         
-        env = np.exp(-t * 1.5)
+        env = np.exp(-env_t * 1.5)
         sig = sig * env
         
         sig = self.dist.process(sig)
@@ -55,22 +65,33 @@ class Bass808(Instrument):
 class DarkPad(Instrument):
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
+        self.osc = UnisonOscillator(sample_rate, "sine", [1.0, 1.005, 0.995], levels=[0.5, 0.3, 0.2])
         
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
         samples = time_context.beats_to_samples(note_event.note.duration)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
         f = note_event.note.pitch.frequency
-        
-        sig = 0.5 * np.sin(2 * np.pi * f * t)
-        sig += 0.3 * np.sin(2 * np.pi * (f * 1.005) * t)
-        sig += 0.2 * np.sin(2 * np.pi * (f * 0.995) * t)
-        
+        sig = self.osc.generate(f, samples, phase=0.0, dtype=time_context.dtype)
+        return self._shape(sig) * note_event.note.velocity * 0.5
+
+    def process_notes_batch(self, note_events: List[NoteEvent], time_context: TimeContext) -> np.ndarray:
+        samples = time_context.beats_to_samples(note_events[0].note.duration)
+        if samples <= 0: return np.array([])
+
+        freqs = [e.note.pitch.frequency for e in note_events]
+        velocities = [e.note.velocity for e in note_events]
+        sig = self.osc.generate_chord(freqs, samples, velocities, phase=0.0, dtype=time_context.dtype)
+        return self._shape(sig) * 0.5
+
+    def _shape(self, sig: np.ndarray) -> np.ndarray:
+        # Slow LFO swell and the pad's linear fade in and out
+        samples = len(sig)
+        t = self.time_axis(samples, sig.dtype)
         lfo = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t)
         sig *= lfo
         
-        env = np.ones(samples)
+        env = np.ones(samples, dtype=sig.dtype)
         attack = int(0.5 * self.sample_rate)
         if attack < samples:
             env[:attack] = np.linspace(0, 1, attack)
@@ -79,4 +100,4 @@ class DarkPad(Instrument):
         if release < samples:
             env[-release:] = np.linspace(1, 0, release)
             
-        return sig * env * note_event.note.velocity * 0.5
+        return sig * env
@@ -1,8 +1,9 @@
 import numpy as np
-from .base import Instrument
-from ..synthesis.oscillators import SawtoothOscillator, SineOscillator, NoiseOscillator
+from typing import List
+from .base import Instrument, decay_samples
+from ..synthesis.oscillators import SawtoothOscillator, SineOscillator, NoiseOscillator, UnisonOscillator
 from ..synthesis.envelopes import ADSREnvelope
-from ..synthesis.filters import LowPassFilter
+from ..synthesis.filters import LowPassFilter, StateVariableFilter, BUTTERWORTH_Q
 from ..core.time import TimeContext
 from ..core.events import NoteEvent
 
@@ -12,71 +13,84 @@ class AcidBass(Instrument):
         self.osc = SawtoothOscillator(sample_rate)
         self.amp_env = ADSREnvelope(attack=0.005, decay=0.2, sustain=0.4, release=0.1)
         self.filter_env = ADSREnvelope(attack=0.01, decay=0.3, sustain=0.1, release=0.2)
+        self.filter = StateVariableFilter(resonance=BUTTERWORTH_Q, mode="low")
         
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
         samples = time_context.beats_to_samples(note_event.note.duration)
         if samples <= 0: return np.array([])
         
         freq = note_event.note.pitch.frequency
-        sig = self.osc.generate(freq, samples)
+        sig = self.osc.generate(freq, samples, phase=0.0, dtype=time_context.dtype)
         
         # Resonant filter sweep
         f_env = self.filter_env.get_curve(samples, self.sample_rate)
         # Map 0-1 env to 300Hz-5000Hz
         cutoff_curve = 300 + 4700 * f_env
         
-        # Apply filter sample-by-sample for sweeping (simple approximation)
-        # Since we don't have a time-varying filter yet, we'll do it in chunks
-        chunk_size = 128
-        for i in range(0, samples, chunk_size):
-            end = min(i + chunk_size, samples)
-            cutoff = cutoff_curve[i]
-            lpf = LowPassFilter(cutoff=cutoff)
-            sig[i:end] = lpf.process(sig[i:end], self.sample_rate)
-            
+        # Continuous sweep: filter state carries across the cutoff changes
+        sig = self.filter.process(sig, self.sample_rate, cutoff=cutoff_curve)
+
         sig = self.amp_env.apply(sig, self.sample_rate)
         return sig * note_event.note.velocity * 0.8
 
 class ProDrums(Instrument):
+    deterministic = False
+    # Slowest exponential decay of each voice and its peak level before velocity
+    DECAYS = {"kick": (8.0, 1.5), "snare": (20.0, 1.2), "hat": (80.0, 0.4)}
+
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
-        
-    def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
+
+    def _voice(self, note_event: NoteEvent) -> str:
         note = note_event.note.pitch.name
-        if "C" in note: return self._kick(note_event, time_context)
-        if "D" in note: return self._snare(note_event, time_context)
-        if "F" in note: return self._hat(note_event, time_context)
+        if "D" in note: return "snare"
+        if "F" in note: return "hat"
+        return "kick"
+
+    def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
+        voice = self._voice(note_event)
+        if voice == "snare": return self._snare(note_event, time_context)
+        if voice == "hat": return self._hat(note_event, time_context)
         return self._kick(note_event, time_context)
 
+    def audible_samples(self, note_event: NoteEvent, time_context: TimeContext) -> int:
+        rate, peak = self.DECAYS[self._voice(note_event)]
+        return decay_samples(rate, self.sample_rate, peak, self.tail_floor_db)
+
     def _kick(self, e, ctx):
-        samples = ctx.beats_to_samples(e.note.duration)
-        t = np.arange(samples) / self.sample_rate
-        f = 55 + 150 * np.exp(-t * 50)
+        samples = self.note_length(e, ctx)
+        t = self.time_axis(samples, ctx.dtype)
+        f = 55 + 150 * np.exp(-self.time_axis(samples) * 50)
         phase = 2 * np.pi * np.cumsum(f) / self.sample_rate
-        out = np.sin(phase) * np.exp(-t * 8)
+        out = np.sin(phase).astype(ctx.dtype) * np.exp(-t * 8)
         # Distortion for Hifi/Techno punch
         out = np.tanh(out * 1.5)
         return out * e.note.velocity
 
     def _snare(self, e, ctx):
-        samples = ctx.beats_to_samples(e.note.duration)
-        t = np.arange(samples) / self.sample_rate
-        body = np.sin(2 * np.pi * 180 * t) * np.exp(-t * 30)
-        noise = np.random.uniform(-1, 1, samples) * np.exp(-t * 20)
+        samples = self.note_length(e, ctx)
+        t = self.time_axis(samples, ctx.dtype)
+        body = np.sin(2 * np.pi * 180 * self.time_axis(samples)).astype(ctx.dtype) * np.exp(-t * 30)
+        noise = self.random_source(e).uniform(-1, 1, samples).astype(ctx.dtype) * np.exp(-t * 20)
         out = (0.3 * body + 0.7 * noise)
         return np.tanh(out * 1.2) * e.note.velocity
 
     def _hat(self, e, ctx):
-        samples = ctx.beats_to_samples(e.note.duration)
-        noise = np.random.uniform(-1, 1, samples)
-        t = np.arange(samples) / self.sample_rate
+        samples = self.note_length(e, ctx)
+        noise = self.random_source(e).uniform(-1, 1, samples).astype(ctx.dtype)
+        t = self.time_axis(samples, ctx.dtype)
         env = np.exp(-t * 80)
         return noise * env * e.note.velocity * 0.4
 
 class SuperSawLead(Instrument):
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
-        self.oscs = [SawtoothOscillator(sample_rate) for _ in range(7)]
+        # Detuned stack for that huge dance sound; a fixed spread of start phases keeps it
+        # wide from the first cycle. Band-limited saws swing half as far as the old direct
+        # ones, hence 2/7 per voice.
+        detunes = [1.0, 1.005, 0.995, 1.01, 0.99, 1.02, 0.98]
+        self.osc = UnisonOscillator(sample_rate, "saw", detunes, levels=[2 / 7] * 7,
+                                    phases=[2 * np.pi * i / 7 for i in range(7)])
         self.env = ADSREnvelope(attack=0.01, decay=0.1, sustain=0.4, release=0.1)
         self.lpf = LowPassFilter(cutoff=4000)
 
@@ -85,16 +99,22 @@ class SuperSawLead(Instrument):
         if samples <= 0: return np.array([])
         
         f = note_event.note.pitch.frequency
-        # Detuned stack for that huge dance sound
-        detunes = [1.0, 1.005, 0.995, 1.01, 0.99, 1.02, 0.98]
-        sig = np.zeros(samples)
-        for i, d in enumerate(detunes):
-            sig += self.oscs[i].generate(f * d, samples)
-            
-        sig = self.env.apply(sig / 7, self.sample_rate)
+        sig = self.osc.generate(f, samples, phase=0.0, dtype=time_context.dtype)
+        sig = self.env.apply(sig, self.sample_rate)
         sig = self.lpf.process(sig, self.sample_rate)
         return sig * note_event.note.velocity
 
+    def process_notes_batch(self, note_events: List[NoteEvent], time_context: TimeContext) -> np.ndarray:
+        samples = time_context.beats_to_samples(note_events[0].note.duration)
+        if samples <= 0: return np.array([])
+
+        # Every note's stack in one lookup; envelope and filter are linear, so they run once on the mix
+        freqs = [e.note.pitch.frequency for e in note_events]
+        velocities = [e.note.velocity for e in note_events]
+        sig = self.osc.generate_chord(freqs, samples, velocities, phase=0.0, dtype=time_context.dtype)
+        sig = self.env.apply(sig, self.sample_rate)
+        return self.lpf.process(sig, self.sample_rate)
+
 class HyperPluck(Instrument):
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
@@ -104,14 +124,16 @@ class HyperPluck(Instrument):
         samples = time_context.beats_to_samples(note_event.note.duration)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
+        t = self.time_axis(samples)
         f = note_event.note.pitch.frequency
         # Sine + high harmonic for a "clicky" pluck
         sig = 0.7 * np.sin(2 * np.pi * f * t) + 0.3 * np.sin(2 * np.pi * f * 4 * t)
-        sig = self.env.apply(sig, self.sample_rate)
+        sig = self.env.apply(sig.astype(time_context.dtype), self.sample_rate)
         return sig * note_event.note.velocity
 
 class AnalogLead(Instrument):
+    deterministic = False
+
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
         self.osc = SawtoothOscillator(sample_rate)
@@ -121,40 +143,52 @@ class AnalogLead(Instrument):
         samples = time_context.beats_to_samples(note_event.note.duration)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
         f = note_event.note.pitch.frequency
         
-        # Simulate VCO Drift (Analog Randomness)
-        drift = 1.0 + 0.002 * np.random.normal(0, 1, samples)
+        # Simulate VCO Drift (Analog Randomness); the phase is accumulated in float64
+        drift = 1.0 + 0.002 * self.random_source(note_event).normal(0, 1, samples)
         phase = 2 * np.pi * f * np.cumsum(drift) / self.sample_rate
         sig = np.sin(phase) + 0.5 * (2 * (phase / (2 * np.pi) % 1) - 1) # Sine + Saw blend
         
-        sig = self.env.apply(sig, self.sample_rate)
+        sig = self.env.apply(sig.astype(time_context.dtype), self.sample_rate)
         return sig * note_event.note.velocity * 0.6
 
 class AtmosphericStrings(Instrument):
+    deterministic = False
+
     def __init__(self, sample_rate: int = 44100):
         super().__init__(sample_rate)
         self.env = ADSREnvelope(attack=0.8, decay=0.5, sustain=0.8, release=1.0)
+        # Ensemble effect via multiple detuned sines
+        self.osc = UnisonOscillator(sample_rate, "sine", [1.0, 1.002, 0.998, 1.01])
+        self.lpf = LowPassFilter(cutoff=1200)
         
     def process_note(self, note_event: NoteEvent, time_context: TimeContext) -> np.ndarray:
         samples = time_context.beats_to_samples(note_event.note.duration)
         if samples <= 0: return np.array([])
         
-        t = np.arange(samples) / self.sample_rate
         f = note_event.note.pitch.frequency
-        
-        # Ensemble effect via multiple detuned sines + noise floor
-        sig = np.zeros(samples)
-        for d in [1.0, 1.002, 0.998, 1.01]:
-            sig += np.sin(2 * np.pi * f * d * t)
-            
-        noise = np.random.uniform(-1, 1, samples) * 0.05
-        sig = (sig / 4) + noise
+        sig = self.osc.generate(f, samples, phase=0.0, dtype=time_context.dtype)
+        # Noise floor
+        sig += self.random_source(note_event).uniform(-1, 1, samples) * 0.05
         
         sig = self.env.apply(sig, self.sample_rate)
         # Gentle low-pass for "string" warmth
-        lpf = LowPassFilter(cutoff=1200)
-        sig = lpf.process(sig, self.sample_rate)
+        sig = self.lpf.process(sig, self.sample_rate)
         
         return sig * note_event.note.velocity * 0.4
+
+    def process_notes_batch(self, note_events: List[NoteEvent], time_context: TimeContext) -> np.ndarray:
+        samples = time_context.beats_to_samples(note_events[0].note.duration)
+        if samples <= 0: return np.array([])
+
+        freqs = [e.note.pitch.frequency for e in note_events]
+        velocities = np.array([e.note.velocity for e in note_events])
+        sig = self.osc.generate_chord(freqs, samples, velocities, phase=0.0, dtype=time_context.dtype)
+        # One noise floor per note, drawn as a matrix and mixed at each note's velocity
+        noise = self.random_source(note_events[0]).uniform(-1, 1, (len(note_events), samples))
+        sig += (velocities * 0.05) @ noise
+
+        sig = self.env.apply(sig, self.sample_rate)
+        sig = self.lpf.process(sig, self.sample_rate)
+        return sig * 0.4
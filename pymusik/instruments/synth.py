@@ -1,21 +1,24 @@
 import numpy as np
+from typing import List
 from .base import Instrument
-from ..synthesis.oscillators import SineOscillator, SawtoothOscillator, SquareOscillator
+from ..synthesis.oscillators import (SineOscillator, SawtoothOscillator, SquareOscillator,
+                                     WavetableSineOscillator, WavetableSawOscillator, WavetableSquareOscillator)
 from ..synthesis.envelopes import ADSREnvelope
 from ..synthesis.filters import LowPassFilter
 from ..core.time import TimeContext
 from ..core.events import NoteEvent
 
 class SynthInstrument(Instrument):
-    def __init__(self, sample_rate: int = 44100, oscillator_type: str = "saw"):
+    def __init__(self, sample_rate: int = 44100, oscillator_type: str = "saw", band_limited: bool = False):
         super().__init__(sample_rate)
         
+        # Band-limited wavetables are alias-free; the direct waveforms keep the original sound
         if oscillator_type == "sine":
-            self.osc = SineOscillator(sample_rate)
+            self.osc = WavetableSineOscillator(sample_rate) if band_limited else SineOscillator(sample_rate)
         elif oscillator_type == "square":
-            self.osc = SquareOscillator(sample_rate)
+            self.osc = WavetableSquareOscillator(sample_rate) if band_limited else SquareOscillator(sample_rate)
         else:
-            self.osc = SawtoothOscillator(sample_rate)
+            self.osc = WavetableSawOscillator(sample_rate) if band_limited else SawtoothOscillator(sample_rate)
             
         self.envelope = ADSREnvelope(attack=0.01, decay=0.1, sustain=0.7, release=0.1)
         self.filter = LowPassFilter(cutoff=2000.0)
@@ -26,9 +29,23 @@ class SynthInstrument(Instrument):
             return np.array([])
             
         freq = note_event.note.pitch.frequency
-        signal = self.osc.generate(freq, duration_samples)
+        signal = self.osc.generate(freq, duration_samples, phase=0.0, dtype=time_context.dtype)
         signal = self.envelope.apply(signal, self.sample_rate)
         signal = self.filter.process(signal, self.sample_rate)
         signal *= note_event.note.velocity
         
         return signal
+
+    def process_notes_batch(self, note_events: List[NoteEvent], time_context: TimeContext) -> np.ndarray:
+        duration_samples = time_context.beats_to_samples(note_events[0].note.duration)
+        if duration_samples <= 0:
+            return np.array([])
+
+        # Oscillators summed at their velocities; envelope and filter run once on the mix
+        signal = np.zeros(duration_samples, dtype=time_context.dtype)
+        for event in note_events:
+            voice = self.osc.generate(event.note.pitch.frequency, duration_samples, phase=0.0, dtype=signal.dtype)
+            voice *= event.note.velocity
+            signal += voice
+        signal = self.envelope.apply(signal, self.sample_rate)
+        return self.filter.process(signal, self.sample_rate)
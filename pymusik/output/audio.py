@@ -1,6 +1,108 @@
+import struct
 import numpy as np
-from scipy.io import wavfile
+from ..utils.scratch import release
 
-def save_wav(filename: str, data: np.ndarray, sample_rate: int = 44100):
-    scaled = np.int16(data * 32767)
-    wavfile.write(filename, sample_rate, scaled)
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+# Frames converted per write when a whole buffer is saved at once
+WRITE_CHUNK_FRAMES = 65536
+
+class WavWriter:
+    def __init__(self, filename: str, sample_rate: int = 44100, channels: int = 1,
+                 bit_depth: int = 16, dither: bool = False):
+        if bit_depth not in (16, 24, 32):
+            raise ValueError(f"Unsupported bit depth: {bit_depth}")
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.channels = channels
+        # 16 and 24 bit are integer PCM, 32 bit is IEEE float
+        self.bit_depth = bit_depth
+        self.dither = dither and bit_depth != 32
+        self.frames_written = 0
+        self._rng = np.random.default_rng()
+        self._file = open(filename, "wb")
+        self._write_header()
+
+    @property
+    def is_float(self) -> bool:
+        return self.bit_depth == 32
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.bit_depth // 8
+
+    def _write_header(self, padded: bool = False):
+        data_bytes = self.frames_written * self.block_align
+        fmt_tag = WAVE_FORMAT_IEEE_FLOAT if self.is_float else WAVE_FORMAT_PCM
+        byte_rate = self.sample_rate * self.block_align
+        fmt = struct.pack("<HHIIHH", fmt_tag, self.channels, self.sample_rate, byte_rate,
+                          self.block_align, self.bit_depth)
+        if self.is_float:
+            # Non-PCM formats carry a cbSize field and a fact chunk with the frame count
+            fmt += struct.pack("<H", 0)
+            extra = b"fact" + struct.pack("<II", 4, self.frames_written)
+        else:
+            extra = b""
+        # An odd-sized data chunk is followed by a pad byte, counted in the RIFF size only
+        riff_size = 4 + (8 + len(fmt)) + len(extra) + (8 + data_bytes) + (data_bytes % 2 if padded else 0)
+        self._file.write(b"RIFF" + struct.pack("<I", riff_size) + b"WAVE")
+        self._file.write(b"fmt " + struct.pack("<I", len(fmt)) + fmt)
+        self._file.write(extra)
+        self._file.write(b"data" + struct.pack("<I", data_bytes))
+
+    def _encode(self, block: np.ndarray) -> bytes:
+        if self.is_float:
+            return np.asarray(block, dtype="<f4").tobytes()
+
+        full_scale = 2 ** (self.bit_depth - 1) - 1
+        scaled = np.asarray(block, dtype=np.float64) * full_scale
+        if self.dither:
+            # TPDF dither: difference of two uniform variables, one LSB each
+            scaled += self._rng.random(scaled.shape) - self._rng.random(scaled.shape)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -full_scale - 1, full_scale, out=scaled)
+
+        if self.bit_depth == 16:
+            return scaled.astype("<i2").tobytes()
+        # 24 bit: keep the low three bytes of each little-endian int32
+        packed = scaled.astype("<i4").reshape(-1, 1).view(np.uint8)[:, :3]
+        return packed.tobytes()
+
+    def write(self, block: np.ndarray):
+        block = np.asarray(block)
+        if self.channels > 1 and (block.ndim != 2 or block.shape[1] != self.channels):
+            raise ValueError(f"Expected blocks of shape (frames, {self.channels}), got {block.shape}")
+        self._file.write(self._encode(block))
+        self.frames_written += len(block)
+
+    def flush(self, padded: bool = False):
+        # Patch the header for what has been written so far, so the file is valid mid-render
+        position = self._file.tell()
+        self._file.seek(0)
+        self._write_header(padded)
+        self._file.seek(position)
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        # RIFF chunks are word aligned: 24 bit mono with an odd frame count needs a pad byte
+        padded = (self.frames_written * self.block_align) % 2 == 1
+        if padded:
+            self._file.write(b"\x00")
+        self.flush(padded)
+        self._file.close()
+
+    def __enter__(self) -> "WavWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def save_wav(filename: str, data: np.ndarray, sample_rate: int = 44100, bit_depth: int = 16, dither: bool = False):
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    with WavWriter(filename, sample_rate, channels, bit_depth, dither) as writer:
+        for start in range(0, len(data), WRITE_CHUNK_FRAMES):
+            writer.write(data[start:start + WRITE_CHUNK_FRAMES])
+            release(data, start, start + WRITE_CHUNK_FRAMES)
@@ -1,4 +1,5 @@
 import mido
+import numpy as np
 from mido import Message, MidiFile, MidiTrack
 from ..engine.audio_graph import Song
 
@@ -11,22 +12,22 @@ def export_midi(song: Song, filename: str):
         mid.tracks.append(midi_track)
         midi_track.append(mido.MetaMessage('track_name', name=track_obj.name))
         
-        events = track_obj.get_events()
+        events = track_obj.compile_events()
+        start_ticks = (events.time * mid.ticks_per_beat).astype(np.int64)
+        duration_ticks = (events.duration * mid.ticks_per_beat).astype(np.int64)
+        velocities = (events.velocity * 127).astype(np.int64)
+        # Chord notes overlap, so note-ons and note-offs are merged by absolute tick;
+        # at equal ticks, offs go first so a repeated pitch is released before it restarts
+        messages = []
+        for start_tick, length, midi, velocity in zip(start_ticks.tolist(), duration_ticks.tolist(),
+                                                      events.midi.tolist(), velocities.tolist()):
+            messages.append((start_tick, 1, 'note_on', midi, velocity))
+            messages.append((start_tick + length, 0, 'note_off', midi, 0))
+        messages.sort(key=lambda m: (m[0], m[1]))
+
         last_tick = 0
-        
-        for event in events:
-            start_tick = int(event.time * mid.ticks_per_beat)
-            delta_tick = start_tick - last_tick
-            
-            midi_track.append(Message('note_on', note=event.note.pitch.midi, 
-                                     velocity=int(event.note.velocity * 127), 
-                                     time=delta_tick))
-            
-            duration_ticks = int(event.note.duration * mid.ticks_per_beat)
-            midi_track.append(Message('note_off', note=event.note.pitch.midi, 
-                                      velocity=0, 
-                                      time=duration_ticks))
-            
-            last_tick = start_tick + duration_ticks
+        for tick, _, kind, midi, velocity in messages:
+            midi_track.append(Message(kind, note=midi, velocity=velocity, time=tick - last_tick))
+            last_tick = tick
 
     mid.save(filename)
@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+import numpy as np
+from .audio import WavWriter
+
+class AudioSink(ABC):
+    # A sound card paces the engine by blocking in write() until it has room; sinks that
+    # accept blocks instantly leave the pacing to the engine's own clock
+    paced = False
+
+    def open(self, sample_rate: int, channels: int = 1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @abstractmethod
+    def write(self, block: np.ndarray):
+        pass
+
+    def close(self):
+        pass
+
+class NullSink(AudioSink):
+    # Discards the audio; for checking real-time budgets headless
+    def __init__(self):
+        self.frames_written = 0
+        self.peak = 0.0
+
+    def write(self, block: np.ndarray):
+        self.frames_written += len(block)
+        if len(block):
+            self.peak = max(self.peak, float(np.max(np.abs(block))))
+
+class FileSink(AudioSink):
+    # Records exactly what would have been played, underruns included
+    def __init__(self, filename: str, bit_depth: int = 16, dither: bool = False):
+        self.filename = filename
+        self.bit_depth = bit_depth
+        self.dither = dither
+        self.writer = None
+
+    def open(self, sample_rate: int, channels: int = 1):
+        super().open(sample_rate, channels)
+        self.writer = WavWriter(self.filename, sample_rate, channels, self.bit_depth, self.dither)
+
+    def write(self, block: np.ndarray):
+        self.writer.write(block)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
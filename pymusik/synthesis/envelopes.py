@@ -1,43 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
 import numpy as np
+from ..utils.math import float_dtype
+
+# Total size of all memoized envelope curves
+ENVELOPE_CACHE_BYTES = 32 * 1024 * 1024
+# Bend of the "exponential" segment shape; "curved" uses the envelope's own `curve`
+EXPONENTIAL_CURVE = 5.0
+SEGMENT_SHAPES = ("linear", "exponential", "curved")
+
+class CurveCache:
+    def __init__(self, max_bytes: int = ENVELOPE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._curves: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        # Envelopes are shared by notes rendered on several threads
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], np.ndarray]) -> np.ndarray:
+        with self._lock:
+            curve = self._curves.get(key)
+            if curve is not None:
+                self._curves.move_to_end(key)
+                return curve
+
+        curve = build()
+        # Handed out to every caller, so nobody may write to it
+        curve.flags.writeable = False
+        with self._lock:
+            if curve.nbytes <= self.max_bytes and key not in self._curves:
+                self._curves[key] = curve
+                self.nbytes += curve.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._curves.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        return curve
+
+    def clear(self):
+        with self._lock:
+            self._curves.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._curves)
+
+curve_cache = CurveCache()
+
+def segment(start: float, end: float, n: int, bend: float = 0.0, dtype=np.float64) -> np.ndarray:
+    # n samples from start to end. bend 0 is a straight line; positive bends move fast
+    # first and settle exponentially, negative ones start slowly.
+    if bend == 0:
+        return np.linspace(start, end, n, dtype=dtype)
+    x = np.linspace(0, 1, n)
+    return (start + (end - start) * (np.expm1(-bend * x) / np.expm1(-bend))).astype(dtype, copy=False)
 
 class Envelope:
+    def get_curve(self, duration_samples: int, sample_rate: int, dtype=np.float64) -> np.ndarray:
+        return self.generate(duration_samples, sample_rate, dtype)
+
     def apply(self, signal: np.ndarray, sample_rate: int) -> np.ndarray:
-        return signal * self.generate(len(signal), sample_rate)
+        # Scales the caller's buffer in place when it is a writable float array of the curve's type
+        curve = self.get_curve(len(signal), sample_rate, dtype=float_dtype(signal))
+        if isinstance(signal, np.ndarray) and signal.flags.writeable and signal.dtype == curve.dtype:
+            signal *= curve
+            return signal
+        return signal * curve
 
 class ADSREnvelope(Envelope):
-    def __init__(self, attack: float = 0.01, decay: float = 0.1, sustain: float = 0.5, release: float = 0.2):
+    def __init__(self, attack: float = 0.01, decay: float = 0.1, sustain: float = 0.5, release: float = 0.2,
+                 shape: str = "linear", curve: float = EXPONENTIAL_CURVE):
+        if shape not in SEGMENT_SHAPES:
+            raise ValueError(f"Unknown envelope shape: {shape}")
         self.attack = attack
         self.decay = decay
         self.sustain = sustain
         self.release = release
+        self.shape = shape
+        self.curve = curve
 
-    def generate(self, duration_samples: int, sample_rate: int) -> np.ndarray:
+    @property
+    def bend(self) -> float:
+        if self.shape == "exponential":
+            return EXPONENTIAL_CURVE
+        if self.shape == "curved":
+            return self.curve
+        return 0.0
+
+    def generate(self, duration_samples: int, sample_rate: int, dtype=np.float64) -> np.ndarray:
+        return self.get_curve(duration_samples, sample_rate, dtype).copy()
+
+    def get_curve(self, duration_samples: int, sample_rate: int, dtype=np.float64) -> np.ndarray:
+        # Memoized and read-only; use generate() for a curve you can modify
+        dtype = np.dtype(dtype)
+        key = (self.attack, self.decay, self.sustain, self.release, self.bend,
+               duration_samples, sample_rate, dtype.str)
+        return curve_cache.get(key, lambda: self._build(duration_samples, sample_rate, dtype))
+
+    def _build(self, duration_samples: int, sample_rate: int, dtype) -> np.ndarray:
         a_samples = int(self.attack * sample_rate)
         d_samples = int(self.decay * sample_rate)
         r_samples = int(self.release * sample_rate)
-        
-        env = np.ones(duration_samples)
-        
+        bend = self.bend
+
+        env = np.ones(duration_samples, dtype=dtype)
+
         if a_samples > 0:
-            a_curve = np.linspace(0, 1, min(a_samples, duration_samples))
+            a_curve = segment(0, 1, min(a_samples, duration_samples), bend, dtype)
             env[:len(a_curve)] = a_curve
-            
+
         if d_samples > 0 and len(env) > a_samples:
             d_end = min(a_samples + d_samples, duration_samples)
-            d_curve = np.linspace(1, self.sustain, d_end - a_samples)
+            d_curve = segment(1, self.sustain, d_end - a_samples, bend, dtype)
             env[a_samples:d_end] = d_curve
-            
+
         if len(env) > a_samples + d_samples:
             env[a_samples + d_samples:] = self.sustain
-            
+
         if r_samples > 0 and duration_samples > r_samples:
-            r_curve = np.linspace(self.sustain, 0, r_samples)
+            r_curve = segment(self.sustain, 0, r_samples, bend, dtype)
             env[-r_samples:] = r_curve
         elif r_samples > 0:
-            r_curve = np.linspace(self.sustain, 0, duration_samples)
+            r_curve = segment(self.sustain, 0, duration_samples, bend, dtype)
             env = r_curve
 
         return env
-
-    def get_curve(self, duration_samples: int, sample_rate: int) -> np.ndarray:
-        return self.generate(duration_samples, sample_rate)
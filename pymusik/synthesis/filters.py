@@ -1,21 +1,237 @@
 import numpy as np
+from functools import lru_cache
+from typing import Optional, Tuple, Union
 from scipy import signal
+from ..utils.math import float_dtype
+
+BUTTERWORTH_Q = 1 / np.sqrt(2)
 
 class Filter:
     def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
         return data
 
-class LowPassFilter(Filter):
-    def __init__(self, cutoff: float = 1000.0, resonance: float = 1.0):
+# Designs are shared by every filter object with the same parameters
+FILTER_CACHE_SIZE = 256
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_filter(kind: str, order: int, cutoff: float, resonance: float, sample_rate: int,
+                  gain_db: float = 0.0) -> np.ndarray:
+    # Returns second-order sections; resonance 1.0 means a plain Butterworth response
+    nyquist = 0.5 * sample_rate
+    if kind in ("low", "high"):
+        if resonance == 1.0:
+            sos = signal.butter(order, cutoff / nyquist, btype=kind, output='sos')
+        else:
+            # Resonant biquad on top, Butterworth for whatever order remains
+            sos = _biquad(kind, cutoff, resonance * BUTTERWORTH_Q, sample_rate)
+            if order > 2:
+                rest = signal.butter(order - 2, cutoff / nyquist, btype=kind, output='sos')
+                sos = np.vstack([sos, rest])
+    elif kind == "band":
+        # resonance is the band's Q
+        half = 1 / (2 * resonance)
+        edge = np.sqrt(1 + half * half)
+        low = max(cutoff * (edge - half), 1.0)
+        high = min(cutoff * (edge + half), 0.999 * nyquist)
+        sos = signal.butter(max(order // 2, 1), [low / nyquist, high / nyquist], btype='band', output='sos')
+    elif kind in ("lowshelf", "highshelf"):
+        sos = _biquad(kind, cutoff, resonance * BUTTERWORTH_Q, sample_rate, gain_db)
+    else:
+        raise ValueError(f"Invalid filter type: {kind}")
+    return sos
+
+def _biquad(kind: str, cutoff: float, q: float, sample_rate: int, gain_db: float = 0.0) -> np.ndarray:
+    # RBJ audio-EQ-cookbook biquads as a single second-order section
+    w0 = 2 * np.pi * cutoff / sample_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == "low":
+        b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    elif kind == "high":
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    else:
+        A = 10 ** (gain_db / 40)
+        root = 2 * np.sqrt(A) * alpha
+        sign = 1 if kind == "lowshelf" else -1
+        b = [A * ((A + 1) - sign * (A - 1) * cos_w0 + root),
+             sign * 2 * A * ((A - 1) - sign * (A + 1) * cos_w0),
+             A * ((A + 1) - sign * (A - 1) * cos_w0 - root)]
+        a = [(A + 1) + sign * (A - 1) * cos_w0 + root,
+             -sign * 2 * ((A - 1) + sign * (A + 1) * cos_w0),
+             (A + 1) + sign * (A - 1) * cos_w0 - root]
+    b = np.array(b) / a[0]
+    a = np.array(a) / a[0]
+    return np.concatenate([b, a])[np.newaxis, :]
+
+class IIRFilter(Filter):
+    kind = "low"
+
+    def __init__(self, cutoff: float = 1000.0, resonance: float = 1.0, order: int = 2, gain_db: float = 0.0):
         self.cutoff = cutoff
         self.resonance = resonance
+        self.order = order
+        self.gain_db = gain_db
+        self._zi: Optional[np.ndarray] = None
+
+    def sos(self, sample_rate: int) -> np.ndarray:
+        return design_filter(self.kind, self.order, float(self.cutoff), float(self.resonance),
+                             sample_rate, float(self.gain_db))
+
+    def bypassed(self, sample_rate: int) -> bool:
+        return False
+
+    def reset(self):
+        self._zi = None
 
     def process(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
-        if self.cutoff >= sample_rate / 2:
+        if self.bypassed(sample_rate):
+            return data
+        # Second-order sections are robust enough to run in float32 when the audio is float32
+        return signal.sosfilt(self.sos(sample_rate).astype(float_dtype(data)), data)
+
+    def process_block(self, data: np.ndarray, sample_rate: int) -> np.ndarray:
+        # Streaming mode: the delay state of the previous call is the starting point of this one
+        if self.bypassed(sample_rate):
             return data
-            
-        nyquist = 0.5 * sample_rate
-        normal_cutoff = self.cutoff / nyquist
-        
-        b, a = signal.butter(2, normal_cutoff, btype='low', analog=False)
-        return signal.lfilter(b, a, data)
+        sos = self.sos(sample_rate).astype(float_dtype(data))
+        if self._zi is None or self._zi.shape[0] != sos.shape[0]:
+            self._zi = np.zeros((sos.shape[0], 2), dtype=sos.dtype)
+        out, self._zi = signal.sosfilt(sos, data, zi=self._zi.astype(sos.dtype, copy=False))
+        return out
+
+class LowPassFilter(IIRFilter):
+    kind = "low"
+
+    def bypassed(self, sample_rate: int) -> bool:
+        return self.cutoff >= sample_rate / 2
+
+class HighPassFilter(IIRFilter):
+    kind = "high"
+
+    def bypassed(self, sample_rate: int) -> bool:
+        return self.cutoff <= 0
+
+class BandPassFilter(IIRFilter):
+    kind = "band"
+
+class LowShelfFilter(IIRFilter):
+    kind = "lowshelf"
+
+    def __init__(self, cutoff: float = 200.0, gain_db: float = 0.0, resonance: float = 1.0):
+        super().__init__(cutoff, resonance, order=2, gain_db=gain_db)
+
+class HighShelfFilter(IIRFilter):
+    kind = "highshelf"
+
+    def __init__(self, cutoff: float = 5000.0, gain_db: float = 0.0, resonance: float = 1.0):
+        super().__init__(cutoff, resonance, order=2, gain_db=gain_db)
+
+# Cutoff and resonance curves are evaluated once per control block
+SVF_CONTROL_BLOCK = 32
+
+class StateVariableFilter(Filter):
+    runtime_state = ("state",)
+
+    def __init__(self, cutoff: float = 1000.0, resonance: float = BUTTERWORTH_Q, mode: str = "low",
+                 control_block: int = SVF_CONTROL_BLOCK):
+        if mode not in ("low", "band", "high"):
+            raise ValueError(f"Invalid filter mode: {mode}")
+        self.cutoff = cutoff
+        self.resonance = resonance
+        self.mode = mode
+        self.control_block = control_block
+        self.state = np.zeros(2)
+
+    def reset(self):
+        self.state = np.zeros(2)
+
+    def process(self, data: np.ndarray, sample_rate: int,
+                cutoff: Union[float, np.ndarray, None] = None,
+                resonance: Union[float, np.ndarray, None] = None) -> np.ndarray:
+        # Starts from rest and leaves the stored state alone, so it is safe to share across threads
+        out, _ = self._run(data, sample_rate, cutoff, resonance, np.zeros(2))
+        return out
+
+    def process_block(self, data: np.ndarray, sample_rate: int,
+                      cutoff: Union[float, np.ndarray, None] = None,
+                      resonance: Union[float, np.ndarray, None] = None) -> np.ndarray:
+        # Continues from the state left by the previous call, so a sweep can be fed in pieces
+        out, self.state = self._run(data, sample_rate, cutoff, resonance, self.state)
+        return out
+
+    def _run(self, data: np.ndarray, sample_rate: int, cutoff: Union[float, np.ndarray, None],
+             resonance: Union[float, np.ndarray, None], state: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(data)
+        if n == 0:
+            return np.array(data, dtype=float_dtype(data)), state
+
+        block = self.control_block
+        n_blocks = -(-n // block)
+        fc = self._control(self.cutoff if cutoff is None else cutoff, n, n_blocks)
+        q = self._control(self.resonance if resonance is None else resonance, n, n_blocks)
+        fc = np.clip(fc, 1.0, 0.49 * sample_rate)
+        q = np.maximum(q, 0.05)
+
+        # Trapezoidal (TPT) SVF with constant coefficients per block:
+        # x[n + 1] = A x[n] + B u[n], y[n] = C x[n] + D u[n]
+        g = np.tan(np.pi * fc / sample_rate)
+        k = 1.0 / q
+        a1 = 1.0 / (1.0 + g * (g + k))
+        a2 = g * a1
+        a3 = g * a2
+        A00, A01, A10, A11 = 2 * a1 - 1, -2 * a2, 2 * a2, 1 - 2 * a3
+        B0, B1 = 2 * a2, 2 * a3
+        if self.mode == "low":
+            C0, C1, D = a2, 1 - a3, a3
+        elif self.mode == "band":
+            C0, C1, D = a1, -a2, a2
+        else:
+            C0, C1, D = -k * a1 - a2, k * a2 - 1 + a3, 1 - k * a2 - a3
+
+        # Coefficients and state stay float64; only the signal buffers use the audio's type
+        u = np.zeros(n_blocks * block, dtype=float_dtype(data))
+        u[:n] = data
+        u = u.reshape(n_blocks, block)
+
+        # Pass 1, all blocks at once: the state each block reaches from rest (f) and
+        # the block transition matrix A^block (columns m0, m1)
+        f0 = np.zeros(n_blocks)
+        f1 = np.zeros(n_blocks)
+        m00, m10 = np.ones(n_blocks), np.zeros(n_blocks)
+        m01, m11 = np.zeros(n_blocks), np.ones(n_blocks)
+        for j in range(block):
+            f0, f1 = A00 * f0 + A01 * f1 + B0 * u[:, j], A10 * f0 + A11 * f1 + B1 * u[:, j]
+            m00, m10 = A00 * m00 + A01 * m10, A10 * m00 + A11 * m10
+            m01, m11 = A00 * m01 + A01 * m11, A10 * m01 + A11 * m11
+
+        # Pass 2: chain the blocks, which is only 2x2 scalar work per block
+        x0 = np.empty(n_blocks)
+        x1 = np.empty(n_blocks)
+        s0, s1 = state
+        for i, (p00, p01, p10, p11, q0, q1) in enumerate(zip(
+                m00.tolist(), m01.tolist(), m10.tolist(), m11.tolist(), f0.tolist(), f1.tolist())):
+            x0[i] = s0
+            x1[i] = s1
+            s0, s1 = p00 * s0 + p01 * s1 + q0, p10 * s0 + p11 * s1 + q1
+
+        # Pass 3: rerun every block from its true starting state to get the output
+        last = n - (n_blocks - 1) * block
+        y = np.empty((n_blocks, block), dtype=u.dtype)
+        for j in range(block):
+            y[:, j] = C0 * x0 + C1 * x1 + D * u[:, j]
+            x0, x1 = A00 * x0 + A01 * x1 + B0 * u[:, j], A10 * x0 + A11 * x1 + B1 * u[:, j]
+            if j == last - 1:
+                state = np.array([x0[-1], x1[-1]])
+        return y.reshape(-1)[:n], state
+
+    def _control(self, values: Union[float, np.ndarray], n: int, n_blocks: int) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 0:
+            return np.full(n_blocks, float(values))
+        if len(values) == n:
+            return values[::self.control_block]
+        if len(values) == n_blocks:
+            return values
+        raise ValueError(f"Control curve has {len(values)} points, expected {n} samples or {n_blocks} blocks")
@@ -1,29 +1,57 @@
 import numpy as np
 from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+# Single-cycle tables of 2**WAVETABLE_BITS samples, read through a 32-bit phase accumulator
+WAVETABLE_BITS = 12
+WAVETABLE_SIZE = 1 << WAVETABLE_BITS
+# One table per octave: level k keeps MAX_HARMONICS >> k harmonics
+MAX_HARMONICS = 1024
+WAVETABLE_LEVELS = MAX_HARMONICS.bit_length()
+WAVETABLE_CACHE_SIZE = 64
+# Samples rendered per lookup pass
+WAVETABLE_BLOCK = 16384
+# Fewest samples per block for a unison stack, however many voices it has
+UNISON_MIN_BLOCK = 1024
 
 class Oscillator(ABC):
+    runtime_state = ("phase",)
+
     def __init__(self, sample_rate: int = 44100):
         self.sample_rate = sample_rate
         self.phase = 0.0
 
     @abstractmethod
-    def generate(self, freq: float, duration_samples: int) -> np.ndarray:
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
+        # phase=None continues from where the previous call stopped; an explicit
+        # start phase renders from there and leaves the oscillator untouched.
+        # Phase is always accumulated in float64 and only the waveform uses `dtype`.
         pass
 
 class SineOscillator(Oscillator):
-    def generate(self, freq: float, duration_samples: int) -> np.ndarray:
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
         t = np.arange(duration_samples) / self.sample_rate
-        phases = 2 * np.pi * freq * t + self.phase
-        output = np.sin(phases)
-        self.phase = phases[-1] % (2 * np.pi) if len(phases) > 0 else self.phase
+        phases = 2 * np.pi * freq * t + (self.phase if phase is None else phase)
+        if np.dtype(dtype) == np.float64:
+            output = np.sin(phases)
+        else:
+            # Wrap first so the narrow type only ever sees one cycle of phase
+            output = np.sin(np.mod(phases, 2 * np.pi).astype(dtype))
+        if phase is None:
+            self.phase = phases[-1] % (2 * np.pi) if len(phases) > 0 else self.phase
         return output
 
 class SawtoothOscillator(Oscillator):
-    def generate(self, freq: float, duration_samples: int) -> np.ndarray:
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
         t = np.arange(duration_samples) / self.sample_rate
-        phases = 2 * freq * t + (self.phase / np.pi)
-        output = 2 * (phases % 2) - 1
-        self.phase = (phases[-1] % 2) * np.pi if len(phases) > 0 else self.phase
+        phases = 2 * freq * t + ((self.phase if phase is None else phase) / np.pi)
+        output = 2 * (phases % 2).astype(dtype, copy=False) - 1
+        if phase is None:
+            self.phase = (phases[-1] % 2) * np.pi if len(phases) > 0 else self.phase
         return output
 
 class SquareOscillator(Oscillator):
@@ -31,13 +59,213 @@ class SquareOscillator(Oscillator):
         super().__init__(sample_rate)
         self.duty_cycle = duty_cycle
 
-    def generate(self, freq: float, duration_samples: int) -> np.ndarray:
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
         t = np.arange(duration_samples) / self.sample_rate
-        phases = freq * t + (self.phase / (2 * np.pi))
-        output = np.where((phases % 1) < self.duty_cycle, 1.0, -1.0)
-        self.phase = (phases[-1] % 1) * 2 * np.pi if len(phases) > 0 else self.phase
+        phases = freq * t + ((self.phase if phase is None else phase) / (2 * np.pi))
+        output = np.where((phases % 1) < self.duty_cycle, 1.0, -1.0).astype(dtype, copy=False)
+        if phase is None:
+            self.phase = (phases[-1] % 1) * 2 * np.pi if len(phases) > 0 else self.phase
         return output
 
 class NoiseOscillator(Oscillator):
-    def generate(self, freq: float, duration_samples: int) -> np.ndarray:
-        return np.random.uniform(-1, 1, duration_samples)
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64, rng=np.random) -> np.ndarray:
+        return rng.uniform(-1, 1, duration_samples).astype(dtype, copy=False)
+
+def _harmonics(waveform: str, duty_cycle: float) -> np.ndarray:
+    # Fourier coefficients c_n of one cycle over t in [0, 1), in rfft scaling
+    n = np.arange(WAVETABLE_SIZE // 2 + 1)
+    coeffs = np.zeros(len(n), dtype=np.complex128)
+    k = n[1:]
+    if waveform == "sine":
+        coeffs[1] = -0.5j
+    elif waveform == "saw":
+        # Rises from -1 to 1 over the cycle
+        coeffs[1:] = 1j / (np.pi * k)
+    elif waveform == "square":
+        # +1 for the first duty_cycle of the cycle, -1 after
+        coeffs[0] = 2 * duty_cycle - 1
+        coeffs[1:] = (1 - np.exp(-2j * np.pi * k * duty_cycle)) / (1j * np.pi * k)
+    else:
+        raise ValueError(f"Unknown waveform: {waveform}")
+    return coeffs * WAVETABLE_SIZE
+
+@lru_cache(maxsize=WAVETABLE_CACHE_SIZE)
+def wavetable(waveform: str, duty_cycle: float = 0.5, dtype: str = "<f8") -> Tuple[np.ndarray, np.ndarray]:
+    # Band-limited tables for every octave as (values, slope to the next sample), each of
+    # shape (WAVETABLE_LEVELS, WAVETABLE_SIZE). Built on first use, shared process-wide.
+    coeffs = _harmonics(waveform, duty_cycle)
+    values = np.empty((WAVETABLE_LEVELS, WAVETABLE_SIZE))
+    for level in range(WAVETABLE_LEVELS):
+        limited = coeffs.copy()
+        limited[(MAX_HARMONICS >> level) + 1:] = 0
+        values[level] = np.fft.irfft(limited, WAVETABLE_SIZE)
+    slopes = np.roll(values, -1, axis=1) - values
+    values = values.astype(dtype)
+    slopes = slopes.astype(dtype)
+    values.flags.writeable = False
+    slopes.flags.writeable = False
+    return values, slopes
+
+def wavetable_level(freq: float, sample_rate: int) -> Optional[int]:
+    # Richest table whose top harmonic stays below Nyquist; None once the fundamental doesn't
+    if freq == 0:
+        return 0
+    harmonics = int(sample_rate / 2 / abs(freq))
+    if harmonics < 1:
+        return None
+    return max(WAVETABLE_LEVELS - harmonics.bit_length(), 0)
+
+class WavetableOscillator(Oscillator):
+    waveform = "sine"
+
+    def tables(self, dtype) -> Tuple[np.ndarray, np.ndarray]:
+        return wavetable(self.waveform, dtype=np.dtype(dtype).str)
+
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
+        # Phase-accumulator lookup with linear interpolation. Unlike the direct oscillators,
+        # the stored phase is that of the next sample, so consecutive calls join seamlessly.
+        start = self.phase if phase is None else phase
+        start_fixed = int(round(start / (2 * np.pi) * 2 ** 32)) % 2 ** 32
+        increment = int(round(freq / self.sample_rate * 2 ** 32)) % 2 ** 32
+        if phase is None:
+            self.phase = ((start_fixed + increment * duration_samples) % 2 ** 32) / 2 ** 32 * 2 * np.pi
+
+        level = wavetable_level(freq, self.sample_rate)
+        if level is None:
+            return np.zeros(duration_samples, dtype=dtype)
+        values, slopes = self.tables(dtype)
+        values, slopes = values[level], slopes[level]
+
+        # Worked in blocks so the index and accumulator scratch stays in cache
+        frac_bits = 32 - WAVETABLE_BITS
+        output = np.empty(duration_samples, dtype=dtype)
+        ramp = np.arange(min(WAVETABLE_BLOCK, duration_samples), dtype=np.uint32)
+        ramp *= np.uint32(increment)
+        acc = np.empty_like(ramp)
+        index = np.empty(len(ramp), dtype=np.intp)
+        for pos in range(0, duration_samples, WAVETABLE_BLOCK):
+            n = min(WAVETABLE_BLOCK, duration_samples - pos)
+            a, i, out = acc[:n], index[:n], output[pos:pos + n]
+            np.add(ramp[:n], np.uint32((start_fixed + increment * pos) % 2 ** 32), out=a)
+            np.right_shift(a, np.uint32(frac_bits), out=i, casting="unsafe")
+            a &= np.uint32((1 << frac_bits) - 1)
+            np.multiply(a.view(np.int32), 2.0 ** -frac_bits, out=out, casting="unsafe")
+            out *= slopes[i]
+            out += values[i]
+        return output
+
+class WavetableSineOscillator(WavetableOscillator):
+    waveform = "sine"
+
+class WavetableSawOscillator(WavetableOscillator):
+    waveform = "saw"
+
+class WavetableSquareOscillator(WavetableOscillator):
+    waveform = "square"
+
+    def __init__(self, sample_rate: int = 44100, duty_cycle: float = 0.5):
+        super().__init__(sample_rate)
+        self.duty_cycle = duty_cycle
+
+    def tables(self, dtype) -> Tuple[np.ndarray, np.ndarray]:
+        return wavetable(self.waveform, float(self.duty_cycle), np.dtype(dtype).str)
+
+class UnisonOscillator(Oscillator):
+    # Detuned voices rendered together as one (voices x samples) wavetable lookup per block
+    # and mixed down with a single matrix product
+    runtime_state = ("phase", "voice_phases")
+
+    def __init__(self, sample_rate: int = 44100, waveform: str = "saw", detunes: Sequence[float] = (1.0,),
+                 levels: Optional[Sequence[float]] = None, phases: Optional[Sequence[float]] = None,
+                 spread: float = 0.0, duty_cycle: float = 0.5):
+        super().__init__(sample_rate)
+        self.waveform = waveform
+        self.duty_cycle = duty_cycle
+        self.detunes = np.asarray(detunes, dtype=np.float64)
+        voices = len(self.detunes)
+        self.levels = np.full(voices, 1.0 / voices) if levels is None else np.asarray(levels, dtype=np.float64)
+        # Start phase of each voice in radians, relative to the phase passed to generate()
+        self.phases = np.zeros(voices) if phases is None else np.asarray(phases, dtype=np.float64)
+        # 0 keeps every voice centred; 1 fans them out from hard left to hard right
+        self.spread = spread
+        self.voice_phases = self.phases.copy()
+
+    @property
+    def voices(self) -> int:
+        return len(self.detunes)
+
+    def pan_gains(self) -> np.ndarray:
+        # Equal-power (2, voices) left/right gains
+        pan = np.linspace(-self.spread, self.spread, self.voices) if self.voices > 1 else np.zeros(1)
+        angle = (pan + 1) * np.pi / 4
+        return np.stack([np.cos(angle), np.sin(angle)]) * self.levels
+
+    def generate(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                 dtype=np.float64) -> np.ndarray:
+        return self._render_stack(freq, duration_samples, phase, dtype, self.levels[None, :])[:, 0]
+
+    def generate_stereo(self, freq: float, duration_samples: int, phase: Optional[float] = None,
+                        dtype=np.float64) -> np.ndarray:
+        # (samples, 2) with the voices spread across the stereo field
+        return self._render_stack(freq, duration_samples, phase, dtype, self.pan_gains())
+
+    def generate_chord(self, freqs: Sequence[float], duration_samples: int, gains: Optional[Sequence[float]] = None,
+                       phase: float = 0.0, dtype=np.float64) -> np.ndarray:
+        # Mono mix of the whole stack played at every frequency at once, each note scaled by
+        # its gain; all notes x voices are rendered in the same lookup
+        gains = np.ones(len(freqs)) if gains is None else np.asarray(gains, dtype=np.float64)
+        voice_freqs = np.outer(freqs, self.detunes).ravel()
+        starts = np.tile(self.phases + phase, len(freqs))
+        mix = np.outer(gains, self.levels).ravel()[None, :]
+        return self._render(voice_freqs, starts, mix, duration_samples, dtype)[:, 0]
+
+    def _render_stack(self, freq: float, duration_samples: int, phase: Optional[float], dtype,
+                      gains: np.ndarray) -> np.ndarray:
+        starts = self.voice_phases if phase is None else self.phases + phase
+        output = self._render(freq * self.detunes, starts, gains, duration_samples, dtype)
+        if phase is None:
+            increments = np.round(freq * self.detunes / self.sample_rate * 2 ** 32)
+            self.voice_phases = np.mod(starts + 2 * np.pi * (increments * duration_samples / 2 ** 32), 2 * np.pi)
+        return output
+
+    def _render(self, freqs: np.ndarray, starts: np.ndarray, gains: np.ndarray, duration_samples: int,
+                dtype) -> np.ndarray:
+        # (samples, channels) mix of one wavetable voice per frequency; gains is (channels, voices)
+        dtype = np.dtype(dtype)
+        start_fixed = [int(round(p / (2 * np.pi) * 2 ** 32)) % 2 ** 32 for p in starts]
+        increments = [int(round(f / self.sample_rate * 2 ** 32)) % 2 ** 32 for f in freqs]
+
+        levels = [wavetable_level(f, self.sample_rate) for f in freqs]
+        # Voices above Nyquist are silent
+        gains = np.array([[g if level is not None else 0.0 for g, level in zip(row, levels)] for row in gains],
+                         dtype=dtype)
+        values, slopes = wavetable(self.waveform, float(self.duty_cycle), dtype.str)
+        values, slopes = values.ravel(), slopes.ravel()
+        rows = np.array([(level or 0) * WAVETABLE_SIZE for level in levels], dtype=np.intp)[:, None]
+
+        frac_bits = 32 - WAVETABLE_BITS
+        output = np.empty((duration_samples, len(gains)), dtype=dtype)
+        # Same scratch size as a single oscillator, however many voices there are
+        step = max(WAVETABLE_BLOCK // len(increments), UNISON_MIN_BLOCK) if increments else WAVETABLE_BLOCK
+        block = min(step, duration_samples)
+        ramp = np.arange(block, dtype=np.uint32) * np.array(increments, dtype=np.uint32)[:, None]
+        acc = np.empty_like(ramp)
+        index = np.empty(ramp.shape, dtype=np.intp)
+        voices = np.empty(ramp.shape, dtype=dtype)
+        for pos in range(0, duration_samples, step):
+            n = min(step, duration_samples - pos)
+            a, i, v = acc[:, :n], index[:, :n], voices[:, :n]
+            offsets = np.array([(s + inc * pos) % 2 ** 32 for s, inc in zip(start_fixed, increments)],
+                               dtype=np.uint32)[:, None]
+            np.add(ramp[:, :n], offsets, out=a)
+            np.right_shift(a, np.uint32(frac_bits), out=i, casting="unsafe")
+            i += rows
+            a &= np.uint32((1 << frac_bits) - 1)
+            np.multiply(a.view(np.int32), 2.0 ** -frac_bits, out=v, casting="unsafe")
+            v *= slopes[i]
+            v += values[i]
+            np.matmul(gains, v, out=output[pos:pos + n].T)
+        return output
@@ -0,0 +1,71 @@
+import numpy as np
+from scipy import signal
+
+# Below this period the whole string fits comfortably in one lfilter pass;
+# above it, stepping one period at a time keeps the work linear in samples.
+RECURSIVE_MAX_PERIOD = 64
+
+class KarplusStrong:
+    def __init__(self, sample_rate: int = 44100, damping: float = 0.995):
+        self.sample_rate = sample_rate
+        self.damping = damping
+
+    def generate(self, freq: float, duration_samples: int, rng=np.random, dtype=np.float64) -> np.ndarray:
+        if duration_samples <= 0:
+            return np.array([], dtype=dtype)
+        if freq <= 0:
+            return np.zeros(duration_samples, dtype=dtype)
+
+        period = int(self.sample_rate / freq)
+        if period <= 1:
+            return np.zeros(duration_samples, dtype=dtype)
+
+        # The string runs in the excitation's dtype; the loop gain is below one, so rounding
+        # errors die away with the note instead of building up
+        excitation = rng.uniform(-1, 1, period).astype(dtype, copy=False)
+        return self.pluck(excitation, duration_samples)
+
+    def pluck(self, excitation: np.ndarray, duration_samples: int) -> np.ndarray:
+        # y[n] = damping * 0.5 * (y[n - L] + y[n - L + 1]), seeded with the excitation
+        period = len(excitation)
+        gain = 0.5 * self.damping
+
+        if period < RECURSIVE_MAX_PERIOD:
+            return self._pluck_recursive(excitation, duration_samples, gain)
+        return self._pluck_blocks(excitation, duration_samples, gain)
+
+    def _pluck_recursive(self, excitation: np.ndarray, duration_samples: int, gain: float) -> np.ndarray:
+        period = len(excitation)
+        x = np.zeros(duration_samples, dtype=excitation.dtype)
+        n = min(period, duration_samples)
+        x[:n] = excitation[:n]
+        # The feedback tap at L - 1 would otherwise leak y[0] into the last seed sample
+        if duration_samples >= period:
+            x[period - 1] -= gain * excitation[0]
+
+        a = np.zeros(period + 1, dtype=x.dtype)
+        a[0] = 1.0
+        a[period - 1] = -gain
+        a[period] = -gain
+        return signal.lfilter(np.ones(1, dtype=x.dtype), a, x)
+
+    def _pluck_blocks(self, excitation: np.ndarray, duration_samples: int, gain: float) -> np.ndarray:
+        period = len(excitation)
+        out = np.empty(duration_samples, dtype=excitation.dtype)
+        n = min(period, duration_samples)
+        out[:n] = excitation[:n]
+
+        # Every sample of the next period only depends on the previous period,
+        # except the last one which also needs the first sample of its own period.
+        pos = period
+        while pos < duration_samples:
+            end = min(pos + period - 1, duration_samples)
+            span = end - pos
+            block = out[pos:end]
+            np.add(out[pos - period:pos - period + span], out[pos - period + 1:pos - period + 1 + span], out=block)
+            block *= gain
+            if end < duration_samples:
+                out[end] = gain * (out[end - period] + out[pos])
+            pos += period
+
+        return out
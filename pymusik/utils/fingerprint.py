@@ -0,0 +1,30 @@
+import numpy as np
+from typing import Any
+
+# Instruments nest oscillators, envelopes and filters only a few levels deep
+MAX_FINGERPRINT_DEPTH = 8
+
+def parameter_fingerprint(obj: Any, _depth: int = 0) -> Any:
+    # Hashable snapshot of an object's configuration. Private attributes and the names a
+    # class lists in `runtime_state` (oscillator phase, filter memory) are left out.
+    if _depth > MAX_FINGERPRINT_DEPTH:
+        return type(obj).__qualname__
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+        return obj
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return ("ndarray", obj.shape, obj.dtype.str, hash(obj.tobytes()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(parameter_fingerprint(v, _depth + 1) for v in obj)
+    if isinstance(obj, dict):
+        return tuple(sorted((str(k), parameter_fingerprint(v, _depth + 1)) for k, v in obj.items()))
+    if hasattr(obj, "__dict__"):
+        skip = set(getattr(obj, "runtime_state", ()))
+        items = tuple(
+            (name, parameter_fingerprint(value, _depth + 1))
+            for name, value in sorted(vars(obj).items())
+            if not name.startswith("_") and name not in skip
+        )
+        return (type(obj).__module__, type(obj).__qualname__, items)
+    return (type(obj).__qualname__, repr(obj))
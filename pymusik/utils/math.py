@@ -9,5 +9,10 @@ def db_to_linear(db: float) -> float:
 def lerp(a: float, b: float, t: float) -> float:
     return a + (b - a) * t
 
+def float_dtype(data) -> np.dtype:
+    # float32 audio stays float32; everything else is processed as float64
+    dtype = np.asarray(data).dtype
+    return dtype if dtype == np.float32 else np.dtype(np.float64)
+
 def clamp(val: float, min_val: float, max_val: float) -> float:
     return max(min_val, min(val, max_val))
@@ -0,0 +1,24 @@
+import mmap
+import tempfile
+from typing import Optional
+import numpy as np
+
+def mapped_zeros(length: int, dtype, directory: Optional[str] = None) -> np.ndarray:
+    # A zeroed buffer backed by a scratch file. The file is unlinked at once; the
+    # mapping lives as long as the array.
+    with tempfile.TemporaryFile(prefix="pymusik-", dir=directory) as scratch:
+        return np.memmap(scratch, dtype=dtype, mode="w+", shape=(max(length, 1),))[:length]
+
+def release(buffer: np.ndarray, start: int, end: int):
+    # Drops samples [start, end) of a memory-mapped buffer from our resident set once they are
+    # finished with. The data stays in the scratch file and is paged back in if read again.
+    # Does nothing for buffers in RAM.
+    mapping = getattr(buffer, "_mmap", None)
+    end = min(end, len(buffer))
+    if mapping is None or not hasattr(mapping, "madvise") or end <= start:
+        return
+    offset = buffer.ctypes.data - np.frombuffer(mapping, dtype=np.uint8).ctypes.data
+    lo = -(-(offset + start * buffer.strides[0]) // mmap.PAGESIZE) * mmap.PAGESIZE
+    hi = (offset + end * buffer.strides[0]) // mmap.PAGESIZE * mmap.PAGESIZE
+    if hi > lo:
+        mapping.madvise(mmap.MADV_DONTNEED, lo, hi - lo)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from pymusik.composition.pattern import Pattern
+from pymusik.core.events import NoteEvent
+from pymusik.core.pitch import Note
+from pymusik.core.time import TimeContext
+from pymusik.engine.audio_graph import Song
+from pymusik.engine.renderer import Renderer
+from pymusik.instruments import drums, lofi, phonk, piano, pro, synth
+
+INSTRUMENTS = [
+    pro.ProDrums, pro.AcidBass, pro.SuperSawLead, pro.HyperPluck, pro.AnalogLead, pro.AtmosphericStrings,
+    phonk.PhonkCowbell, phonk.Bass808, phonk.DarkPad,
+    lofi.GuitarInstrument, lofi.SaxInstrument, lofi.VinylEffect, lofi.MellowPiano,
+    synth.SynthInstrument, piano.PianoInstrument, drums.DrumInstrument,
+]
+
+# float32 renders may differ from the float64 reference by no more than this (about -100 dBFS)
+MAX_ABS_ERROR = 1e-5
+
+
+def build_song(dtype) -> Song:
+    song = Song(bpm=124, duration_beats=16, dtype=dtype)
+    for i, instrument in enumerate(INSTRUMENTS):
+        track = song.create_track(instrument.__name__, instrument())
+        track.gain = 0.2
+        track.sidechain = i % 2 == 0
+        pattern = Pattern(loop=True, length_beats=8.0)
+        for pitch, duration in [("C3", 1.0), ("D3", 0.5), ("F3", 2.5), ("G3", 4.0)]:
+            pattern.add_note(pitch, duration, 0.7)
+        track.set_pattern(pattern)
+    return song
+
+
+def test_float32_render_matches_float64_reference():
+    reference = Renderer(build_song(np.float64), seed=1).render()
+    single = Renderer(build_song(np.float32), seed=1).render()
+
+    assert reference.dtype == np.float64
+    assert single.dtype == np.float32
+    assert len(single) == len(reference)
+    assert np.max(np.abs(single.astype(np.float64) - reference)) < MAX_ABS_ERROR
+
+
+@pytest.mark.parametrize("instrument", INSTRUMENTS, ids=lambda cls: cls.__name__)
+def test_instruments_render_in_the_song_dtype(instrument):
+    event = NoteEvent(time=0.0, note=Note("C3", 2.0, 0.7), seed=9)
+    signals = {}
+    for dtype in (np.float32, np.float64):
+        synth_instrument = instrument()
+        signals[dtype] = np.asarray(synth_instrument.process_note(event, TimeContext(bpm=120, dtype=dtype)))
+        assert signals[dtype].dtype == dtype
+
+    error = np.max(np.abs(signals[np.float32].astype(np.float64) - signals[np.float64]))
+    assert error < MAX_ABS_ERROR